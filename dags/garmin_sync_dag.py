@@ -13,7 +13,7 @@ from airflow.operators.python import PythonOperator
 import sys
 sys.path.insert(0, '/opt/airflow')
 
-from src.tasks import run_daily_sync, run_full_backfill
+from src.tasks import run_daily_sync, run_full_backfill, run_maintenance
 
 
 # Default arguments for all tasks
@@ -68,3 +68,19 @@ with DAG(
         },
     )
 
+
+# Weekly maintenance DAG: keep tables physically ordered by date
+with DAG(
+    dag_id='garmin_weekly_maintenance',
+    default_args=default_args,
+    description='Compact tables in date order and refresh planner statistics',
+    schedule_interval='0 5 * * 0',  # Sundays, before the daily sync
+    start_date=datetime(2024, 1, 1),
+    catchup=False,
+    tags=['garmin', 'maintenance', 'weekly'],
+) as maintenance_dag:
+    
+    compact_task = PythonOperator(
+        task_id='compact_tables',
+        python_callable=run_maintenance,
+    )
@@ -2,22 +2,51 @@
 AI-powered exploration layer for Garmin data.
 Natural language question -> SQL query -> Results -> Insights
 """
+from __future__ import annotations
+
+import os
+import re
 import sys
-import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple, Dict, Any, Optional, List
-from dataclasses import dataclass, field, asdict
-import pandas as pd
+from typing import Callable, Iterator, Tuple, Dict, Any, Optional, List, TYPE_CHECKING
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 
+# pandas (and numpy, via the semantic cache) are imported lazily: they are only
+# needed once the first query result arrives, and importing them takes longer
+# than the rest of the module. See preload_heavy_modules().
+if TYPE_CHECKING:
+    import pandas as pd
+    from .semantic_cache import SemanticCache, CacheEntry
+
 # Load environment variables
 load_dotenv()
 
 from .llm_client import create_llm_client
-from .database import execute_query, check_connection
+from .database import execute_query, get_data_version, export_query_csv, as_subquery
+from .cache import TTLCache
+from .sql_examples import format_sql_examples
+from .sql_templates import match_template, activity_type_hints
+
+
+def preload_heavy_modules():
+    """
+    Import pandas/numpy in a background thread.
+    
+    Called at CLI startup so the import overlaps the first LLM round trip
+    instead of adding to it; code that needs pandas simply waits on the
+    import lock if it gets there first.
+    """
+    def load():
+        import pandas  # noqa: F401
+        from . import semantic_cache  # noqa: F401
+    threading.Thread(target=load, daemon=True).start()
 
 
-@dataclass
+@dataclass(slots=True)
 class ConversationTurn:
     """
     Represents a single turn in the conversation history.
@@ -28,11 +57,26 @@ class ConversationTurn:
     summary: str
     columns: List[str] = field(default_factory=list)
     row_count: int = 0
-    sample_data: Optional[str] = None  # First few rows as markdown, for detailed follow-ups
+    sample_data: Optional[str] = None  # First few rows as CSV, for detailed follow-ups
+    # Truncated forms used in the conversation context, computed once per turn
+    sql_preview: str = field(init=False, repr=False, compare=False)
+    summary_preview: str = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self.sql_preview = self.sql[:200] + ('...' if len(self.sql) > 200 else '')
+        self.summary_preview = self.summary[:300] + ('...' if len(self.summary) > 300 else '')
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for JSON serialization."""
-        return asdict(self)
+        # Flat fields only, so skip asdict()'s recursive copy
+        return {
+            "question": self.question,
+            "sql": self.sql,
+            "summary": self.summary,
+            "columns": self.columns,
+            "row_count": self.row_count,
+            "sample_data": self.sample_data,
+        }
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'ConversationTurn':
@@ -40,7 +84,8 @@ class ConversationTurn:
         return cls(**data)
     
     @classmethod
-    def from_response(cls, question: str, sql: str, summary: str, df: pd.DataFrame, include_sample: bool = True) -> 'ConversationTurn':
+    def from_response(cls, question: str, sql: str, summary: str, df: pd.DataFrame, include_sample: bool = True,
+                      sample_data: Optional[str] = None) -> 'ConversationTurn':
         """
         Create a ConversationTurn from a query response.
         
@@ -49,11 +94,11 @@ class ConversationTurn:
             sql: The SQL query that was executed
             summary: The LLM-generated summary
             df: The result DataFrame
-            include_sample: Whether to include sample data (first 5 rows as markdown)
+            include_sample: Whether to include sample data (first 5 rows as CSV)
+            sample_data: Sample rows already formatted by the caller (skips formatting)
         """
-        sample_data = None
-        if include_sample and not df.empty:
-            sample_data = df.head(5).to_markdown(index=False)
+        if sample_data is None and include_sample and not df.empty:
+            sample_data = format_preview(df, 5)
         
         return cls(
             question=question,
@@ -61,14 +106,25 @@ class ConversationTurn:
             summary=summary,
             columns=list(df.columns) if not df.empty else [],
             row_count=len(df),
-            sample_data=sample_data
+            sample_data=sample_data if include_sample else None
         )
 
 
+# Only the most recent results are worth their sample rows in a follow-up prompt
+MAX_SAMPLE_TURNS = 2
+
+
 def format_conversation_context(history: List[ConversationTurn], include_sample_data: bool = False) -> str:
     """
     Format conversation history for inclusion in LLM prompts.
     
+    The history block only depends on the turns themselves, so it renders to
+    the same bytes every time and grows append-only across a conversation,
+    which keeps it inside the provider's prompt-prefix cache. Sample rows vary
+    per call (include_sample_data depends on the new question), so they go in
+    a separate section after it. A turn that exactly repeats the previous one
+    (same question and SQL) is not rendered twice.
+    
     Args:
         history: List of previous conversation turns
         include_sample_data: Whether to include sample data from previous queries
@@ -80,22 +136,79 @@ def format_conversation_context(history: List[ConversationTurn], include_sample_
         return ""
     
     context_parts = ["## Previous Conversation Context\n"]
-    
+    previous = None
     for i, turn in enumerate(history, 1):
+        if previous is not None and turn.question == previous.question and turn.sql == previous.sql:
+            continue
+        previous = turn
         context_parts.append(f"### Turn {i}")
         context_parts.append(f"**User asked:** {turn.question}")
-        context_parts.append(f"**SQL used:** `{turn.sql[:200]}{'...' if len(turn.sql) > 200 else ''}`")
+        context_parts.append(f"**SQL used:** `{turn.sql_preview}`")
         context_parts.append(f"**Result:** {turn.row_count} rows with columns: {', '.join(turn.columns)}")
-        context_parts.append(f"**Summary:** {turn.summary[:300]}{'...' if len(turn.summary) > 300 else ''}")
-        
-        if include_sample_data and turn.sample_data:
-            context_parts.append(f"**Sample data:**\n{turn.sample_data}")
-        
+        context_parts.append(f"**Summary:** {turn.summary_preview}")
         context_parts.append("")  # Empty line between turns
     
+    if include_sample_data:
+        samples = [
+            (i, turn) for i, turn in enumerate(history, 1) if turn.sample_data
+        ][-MAX_SAMPLE_TURNS:]
+        if samples:
+            context_parts.append("## Sample Data From Previous Results\n")
+            for i, turn in samples:
+                context_parts.append(f"### Turn {i} (CSV)\n{turn.sample_data}")
+                context_parts.append("")
+    
     return "\n".join(context_parts)
 
 
+# Keywords that suggest the user wants to reference previous data directly
+DETAIL_KEYWORDS = frozenset([
+    # Referencing previous results
+    "those", "that", "these", "the data", "the results", "show me",
+    "filter", "sort", "group", "breakdown", "break down", "by month",
+    "by week", "by day", "more detail", "drill down", "zoom in",
+    "which ones", "what about", "same", "similar", "like before",
+    # Explicitly asking for raw/actual data
+    "raw data", "actual data", "the numbers", "actual numbers",
+    "exact", "specific", "details", "all the", "full data",
+    "underlying", "source data",
+    # Visualization/chart requests (need data context)
+    "chart", "graph", "plot", "diagram", "visualize", "visualise",
+    "show as", "display as", "draw", "create a", "make a",
+    "bar chart", "line chart", "pie chart", "scatter"
+])
+
+def _trie_pattern(words) -> str:
+    """
+    Build a prefix-factored regex from literal words (e.g. "sort|same|show me"
+    becomes "s(?:ame|how\\ me|ort)").
+    
+    A flat alternation makes the regex engine try every keyword at every
+    position; factoring shared prefixes into a trie means each position only
+    follows the branch matching the next character, like an Aho-Corasick scan.
+    """
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True  # end of word
+    
+    def build(node) -> str:
+        if "" in node:
+            # Any keyword ending here is a match; we only need to know one exists
+            return ""
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    
+    return build(trie)
+
+
+# Single trie-shaped regex scanned in C instead of a Python-level substring check per keyword.
+# Case folding happens inside the scan, so the question isn't copied by lower() first.
+_DETAIL_RE = re.compile(_trie_pattern(DETAIL_KEYWORDS), re.IGNORECASE)
+
+
 def needs_detailed_context(question: str) -> bool:
     """
     Determine if the follow-up question needs detailed data from previous queries.
@@ -106,86 +219,133 @@ def needs_detailed_context(question: str) -> bool:
     Returns:
         True if the question likely needs access to previous raw data
     """
-    # Keywords that suggest the user wants to reference previous data directly
-    detail_keywords = [
-        # Referencing previous results
-        "those", "that", "these", "the data", "the results", "show me",
-        "filter", "sort", "group", "breakdown", "break down", "by month",
-        "by week", "by day", "more detail", "drill down", "zoom in",
-        "which ones", "what about", "same", "similar", "like before",
-        # Explicitly asking for raw/actual data
-        "raw data", "actual data", "the numbers", "actual numbers",
-        "exact", "specific", "details", "all the", "full data",
-        "underlying", "source data",
-        # Visualization/chart requests (need data context)
-        "chart", "graph", "plot", "diagram", "visualize", "visualise",
-        "show as", "display as", "draw", "create a", "make a",
-        "bar chart", "line chart", "pie chart", "scatter"
-    ]
-    
-    question_lower = question.lower()
-    return any(keyword in question_lower for keyword in detail_keywords)
+    return _DETAIL_RE.search(question) is not None
+
+
+# Single source of truth for the schema shown to the LLM: table -> (description, columns).
+# Column notes are only given where the name and type don't already say it all;
+# the schema is rendered in a compact one-line-per-table form to keep the static
+# prompt short.
+TABLE_SCHEMA: Dict[str, Tuple[str, List[Tuple[str, str, str]]]] = {
+    "activities": ("one row per workout/activity", [
+        ("activity_id", "varchar", ""),
+        ("source", "varchar", "always 'garmin'"),
+        ("start_time_utc", "timestamp", ""),
+        ("date", "date", ""),
+        ("activity_type", "varchar", "running|cycling|swimming|walking|hiking|strength_training|..."),
+        ("activity_name", "varchar", ""),
+        ("distance_km", "real", ""),
+        ("duration_min", "real", "total"),
+        ("moving_time_min", "real", ""),
+        ("avg_hr", "real", "bpm"),
+        ("max_hr", "real", "bpm"),
+        ("elevation_gain_m", "real", ""),
+        ("avg_speed_kmh", "real", ""),
+        ("calories", "real", ""),
+    ]),
+    "sleep": ("one row per night", [
+        ("date", "date", "usually the morning you woke up"),
+        ("sleep_start", "timestamp", ""),
+        ("sleep_end", "timestamp", ""),
+        ("sleep_duration_minutes", "real", "total sleep"),
+        ("deep_sleep_minutes", "real", ""),
+        ("light_sleep_minutes", "real", ""),
+        ("rem_sleep_minutes", "real", ""),
+        ("awake_minutes", "real", "awake during the night"),
+        ("sleep_score", "real", "0-100"),
+        ("avg_hr", "real", "during sleep"),
+        ("lowest_hr", "real", "during sleep"),
+        ("avg_respiration", "real", ""),
+    ]),
+    "daily_summary": ("one row per day", [
+        ("date", "date", ""),
+        ("steps", "integer", ""),
+        ("calories", "real", "active"),
+        ("resting_hr", "real", ""),
+        ("min_hr", "real", ""),
+        ("max_hr", "real", ""),
+        ("stress_avg", "real", ""),
+        ("body_battery_charged", "real", ""),
+        ("body_battery_drained", "real", ""),
+        ("body_battery_highest", "real", ""),
+        ("body_battery_lowest", "real", ""),
+        ("floors_climbed", "integer", ""),
+        ("distance_km", "real", ""),
+    ]),
+}
+
+SCHEMA_NOTES = """Notes: PostgreSQL syntax; CURRENT_DATE, date - INTERVAL '30 days', DATE_TRUNC(), EXTRACT() and window functions are available; single-quote string literals.
+Every table is indexed on date: filter with plain ranges (date >= '2024-01-01' AND date < '2024-07-01'), not functions of date in WHERE (EXTRACT(YEAR FROM date) = 2024 can't use the index). EXTRACT()/DATE_TRUNC() are fine in SELECT and GROUP BY."""
+
+
+def _build_schema_description() -> str:
+    """Schema for SQL generation: one line per table with column types and short notes."""
+    parts = ["", "Tables (column type [note]):"]
+    for table, (description, columns) in TABLE_SCHEMA.items():
+        cols = ", ".join(
+            f"{name} {col_type}" + (f" [{col_note}]" if col_note else "")
+            for name, col_type, col_note in columns
+        )
+        parts.append(f"{table}({cols}) -- {description}")
+    parts.append("")
+    parts.append(SCHEMA_NOTES)
+    return "\n".join(parts) + "\n"
+
+
+def _build_tables_compact() -> str:
+    """One line per table (column names only) for the visualization prompts."""
+    lines = ["Available tables in database:"]
+    for table, (_, columns) in TABLE_SCHEMA.items():
+        lines.append(f"- {table}({', '.join(name for name, _, _ in columns)})")
+    return "\n".join(lines)
 
 
 # Schema description for the LLM
-SCHEMA_DESCRIPTION = """
-Available tables in PostgreSQL:
-
-1. **activities** - One row per workout/activity
-   Columns:
-   - activity_id (varchar): Unique activity ID
-   - source (varchar): Always 'garmin'
-   - start_time_utc (timestamp): When activity started
-   - date (date): Activity date
-   - activity_type (varchar): e.g., 'running', 'cycling', 'strength_training'
-   - activity_name (varchar): Name given to the activity
-   - distance_km (real): Distance in kilometers
-   - duration_min (real): Total duration in minutes
-   - moving_time_min (real): Time actually moving
-   - avg_hr (real): Average heart rate (bpm)
-   - max_hr (real): Maximum heart rate (bpm)
-   - elevation_gain_m (real): Elevation gain in meters
-   - avg_speed_kmh (real): Average speed in km/h
-   - calories (real): Calories burned
-
-2. **sleep** - One row per night's sleep
-   Columns:
-   - date (date): Date of the sleep (usually the morning you woke up)
-   - sleep_start (timestamp): When you went to sleep
-   - sleep_end (timestamp): When you woke up
-   - sleep_duration_minutes (real): Total sleep time
-   - deep_sleep_minutes (real): Deep sleep duration
-   - light_sleep_minutes (real): Light sleep duration
-   - rem_sleep_minutes (real): REM sleep duration
-   - awake_minutes (real): Time awake during the night
-   - sleep_score (real): Overall sleep score (0-100)
-   - avg_hr (real): Average heart rate during sleep
-   - lowest_hr (real): Lowest heart rate during sleep
-   - avg_respiration (real): Average respiration rate
-
-3. **daily_summary** - One row per day with wellness metrics
-   Columns:
-   - date (date): The date
-   - steps (integer): Total steps
-   - calories (real): Active calories burned
-   - resting_hr (real): Resting heart rate for the day
-   - min_hr (real): Minimum heart rate
-   - max_hr (real): Maximum heart rate
-   - stress_avg (real): Average stress level
-   - body_battery_charged (real): Body battery charged amount
-   - body_battery_drained (real): Body battery drained amount
-   - body_battery_highest (real): Highest body battery level
-   - body_battery_lowest (real): Lowest body battery level
-   - floors_climbed (integer): Floors climbed
-   - distance_km (real): Total distance in km
-
-Notes:
-- Use PostgreSQL syntax
-- Date functions: CURRENT_DATE, date - INTERVAL '30 days', DATE_TRUNC(), EXTRACT(), etc.
-- Aggregations: AVG(), SUM(), COUNT(), etc.
-- Window functions are supported
-- Use single quotes for string literals
-"""
+SCHEMA_DESCRIPTION = _build_schema_description()
+TABLES_COMPACT = _build_tables_compact()
+
+
+# Static system prompt for SQL generation. Kept byte-identical across calls (no
+# per-question interpolation) so the provider can serve it from its prefix cache.
+SQL_SYSTEM_PROMPT = f"""You are an expert SQL assistant. Your job is to write a PostgreSQL query that answers the user's question.
+
+{SCHEMA_DESCRIPTION}
+
+Instructions:
+- Write a single SELECT query that answers the question
+- Use proper PostgreSQL syntax
+- Return ONLY the SQL query, no explanation, no markdown, no code blocks
+- Do not include semicolons at the end
+- Use appropriate JOINs if multiple tables are needed
+- Add LIMIT clauses for large result sets when appropriate
+
+{format_sql_examples()}"""
+
+
+# Payload inside a markdown code fence (```sql ... ``` / ```json ... ```)
+_CODE_FENCE = re.compile(r"```[a-zA-Z]*\s*(.*?)\s*```", re.DOTALL)
+
+
+def _extract_sql(text: str) -> str:
+    """Extract the SQL statement from an LLM response (strips code fences and trailing ';')."""
+    match = _CODE_FENCE.search(text)
+    if match:
+        text = match.group(1)
+    return text.strip().rstrip(";").rstrip()
+
+
+# Memo for deterministic (temperature 0) LLM calls, keyed on a hash of exactly what
+# is sent. Calls with temperature > 0 (summaries) are never memoized.
+_response_cache = TTLCache(maxsize=256, ttl=float(os.environ.get("RESPONSE_CACHE_TTL", str(24 * 3600))))
+
+
+def _response_key(system_prompt: str, prompt: str, model_tier: str = "large") -> str:
+    """Content hash of an LLM request (system prompt, user prompt and model tier)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (model_tier, system_prompt, prompt):
+        digest.update(part.encode())
+        digest.update(b"\x1f")
+    return digest.hexdigest()
 
 
 def question_to_sql(question: str, llm_client, conversation_history: List[ConversationTurn] = None) -> str:
@@ -200,6 +360,12 @@ def question_to_sql(question: str, llm_client, conversation_history: List[Conver
     Returns:
         SQL query string
     """
+    # Common standalone questions ("average X over the last N days") don't need the LLM
+    if not conversation_history:
+        template_sql = match_template(question)
+        if template_sql:
+            return template_sql
+    
     # Build conversation context if we have history
     context_section = ""
     if conversation_history:
@@ -208,66 +374,196 @@ def question_to_sql(question: str, llm_client, conversation_history: List[Conver
         context_section = format_conversation_context(conversation_history, include_sample_data=include_sample)
         context_section += "\n\n**Important:** The user may be asking a follow-up question. Consider the previous queries and results when writing the new query. You may need to modify, filter, or build upon previous queries.\n\n"
     
-    prompt = f"""You are an expert SQL assistant. Your job is to write a PostgreSQL query that answers the user's question.
+    followup_note = "- This is a follow-up question. Consider the context of previous queries and results.\n" if conversation_history else ""
+    hints = "".join(f"{hint}\n" for hint in activity_type_hints(question))
+    
+    prompt = f"""{context_section}User question: "{question}"
+{hints}{followup_note}
+SQL Query:"""
+    
+    # Same question + same context -> same prompt; temperature 0 makes it safe to reuse
+    key = _response_key(SQL_SYSTEM_PROMPT, prompt)
+    sql = _response_cache.get(key)
+    if sql is None:
+        response = llm_client.generate(prompt, temperature=0.0, system_prompt=SQL_SYSTEM_PROMPT)
+        sql = _extract_sql(response)
+        _response_cache.set(key, sql)
+    return sql
 
-{SCHEMA_DESCRIPTION}
 
-{context_section}User question: "{question}"
+# Write the summary and the visualization plan in one LLM call instead of two
+# concurrent ones: fewer provider calls and one prefill of the results, at the
+# cost of the summary no longer overlapping the visualization query
+COMBINE_ANSWER_CALLS = os.environ.get("COMBINE_ANSWER_CALLS", "0") == "1"
 
-Instructions:
-- Write a single SELECT query that answers the question
-- Use proper PostgreSQL syntax
-- Return ONLY the SQL query, no explanation, no markdown, no code blocks
-- Do not include semicolons at the end
-- Use appropriate JOINs if multiple tables are needed
-- Add LIMIT clauses for large result sets when appropriate
-{f"- This is a follow-up question. Consider the context of previous queries and results." if conversation_history else ""}
 
-SQL Query:"""
-    
-    sql = llm_client.generate(prompt, temperature=0.0)
-    
-    # Clean up the response (remove markdown, extra whitespace)
-    sql = sql.strip()
-    if sql.startswith("```"):
-        # Remove markdown code blocks
-        lines = sql.split("\n")
-        sql = "\n".join([l for l in lines if not l.startswith("```")])
-    sql = sql.strip().rstrip(";")
+# Upper bound on rows fetched for an answer; a query that accidentally selects the
+# whole history shouldn't be pulled into memory (CLI --export still gets every row)
+MAX_RESULT_ROWS = int(os.environ.get("MAX_RESULT_ROWS", "10000"))
+
+
+# Charts can't usefully show more points than this; the visualization query is
+# capped in SQL instead of fetching everything
+VIZ_ROW_LIMIT = 5000
+
+# Line charts over more points than this are re-aggregated into day/week/month
+# buckets in PostgreSQL rather than thinned out in the render path
+VIZ_LINE_MAX_POINTS = 2000
+
+
+# Process-wide LLM client; the Gemini SDK keeps its connection open, so reusing
+# one client avoids a fresh TLS handshake on every question
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Get the shared LLM client, creating it on first use."""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                _llm_client = create_llm_client("gemini")
+    return _llm_client
+
+
+# Process-wide semantic cache (created on first use; SEMANTIC_CACHE=0 disables it)
+_semantic_cache: Optional[SemanticCache] = None
+
+
+def get_semantic_cache(llm_client) -> Optional[SemanticCache]:
+    """Get the shared semantic cache, or None if it is disabled."""
+    global _semantic_cache
+    if os.environ.get("SEMANTIC_CACHE", "1") == "0":
+        return None
+    if _semantic_cache is None:
+        from .semantic_cache import SemanticCache
+        _semantic_cache = SemanticCache(
+            llm_client.embed,
+            threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            ttl=float(os.environ.get("SEMANTIC_CACHE_TTL", "3600")),
+            path=Path(os.environ.get("SEMANTIC_CACHE_PATH", "~/.garmin_ai_cache/semantic_cache.db")).expanduser(),
+        )
+    return _semantic_cache
+
+
+def lookup_cached_sql(question: str, llm_client) -> Optional[CacheEntry]:
+    """
+    Look up SQL previously generated for the same (or a near-identical) question.
     
-    return sql
+    Cache errors (e.g. the embedding call failing) are treated as a miss.
+    """
+    cache = get_semantic_cache(llm_client)
+    if cache is None:
+        return None
+    try:
+        return cache.lookup(question)
+    except Exception as e:
+        print(f"Warning: Semantic cache lookup failed: {e}")
+        return None
 
 
-def run_sql(sql: str) -> pd.DataFrame:
+# Off-critical-path work (cache writes need an embedding round trip)
+_background_executor = ThreadPoolExecutor(max_workers=2)
+
+
+def store_cached_sql(question: str, sql: str, llm_client, **extra):
+    """Cache the SQL for a question after it executed successfully."""
+    cache = get_semantic_cache(llm_client)
+    if cache is None:
+        return
+    try:
+        cache.store(question, sql, **extra)
+    except Exception as e:
+        print(f"Warning: Semantic cache store failed: {e}")
+
+
+# Exact-SQL result cache. Entries are keyed on the data version as well, so the
+# next sync invalidates them; the TTL bounds memory for idle entries and covers
+# the moments the version lags a write or repeats after a stats reset.
+_result_cache = TTLCache(maxsize=128, ttl=float(os.environ.get("QUERY_CACHE_TTL", "300")))
+
+
+def run_sql(sql: str, limit: Optional[int] = None, data_version: Optional[int] = None) -> pd.DataFrame:
     """
     Execute SQL query and return results as DataFrame.
+    
+    Identical SQL against unchanged data is served from an in-process cache
+    (paraphrased questions often produce the same query).
+    
+    Args:
+        sql: SQL query string
+        limit: Optional row cap applied in the database rather than after fetching
+        data_version: get_data_version() token for the cache key; read once per
+            question by the callers so each query doesn't pay another round trip
     """
     try:
-        return execute_query(sql)
+        if data_version is None:
+            data_version = get_data_version()
+        key = (sql.strip(), limit, data_version)
+        df = _result_cache.get(key)
+        if df is None:
+            df = execute_query(sql, limit=limit)
+            _result_cache.set(key, df)
+        # Callers may modify the frame, so never hand out the cached object itself
+        return df.copy()
+    except ConnectionError:
+        raise
     except Exception as e:
         raise RuntimeError(f"SQL execution failed: {e}\n\nQuery:\n{sql}")
 
 
-def summarize_results(question: str, sql: str, df: pd.DataFrame, llm_client, conversation_history: List[ConversationTurn] = None) -> str:
+def run_answer_sql(sql: str, data_version: Optional[int] = None) -> pd.DataFrame:
     """
-    Use LLM to summarize query results and provide insights.
+    Execute the answer query with a hard row cap.
     
-    Args:
-        question: The user's question
-        sql: The SQL query that was executed
-        df: The result DataFrame
-        llm_client: LLM client instance
-        conversation_history: Optional list of previous conversation turns for context
+    Fetches at most MAX_RESULT_ROWS + 1 rows (the cap is applied in SQL); the
+    extra row only tells us the result was cut off, in which case the frame is
+    trimmed and flagged with df.attrs["truncated"].
+    """
+    df = run_sql(sql, limit=MAX_RESULT_ROWS + 1, data_version=data_version)
+    if len(df) > MAX_RESULT_ROWS:
+        print(f"Warning: Query returned more than {MAX_RESULT_ROWS} rows; keeping the first {MAX_RESULT_ROWS}")
+        df = df.iloc[:MAX_RESULT_ROWS].copy()
+        df.attrs["truncated"] = True
+    return df
+
+
+def format_preview(df: pd.DataFrame, max_rows: int) -> str:
+    """
+    Serialize the first rows of a DataFrame compactly for an LLM prompt.
     
-    Returns:
-        Summary text with insights
+    CSV with floats rounded to 2 decimals uses far fewer tokens than a padded
+    markdown table and is much cheaper to build than tabulate's output.
     """
-    # Format results as markdown table (limit to first 50 rows for context)
+    return df.head(max_rows).round(2).to_csv(index=False).rstrip("\n")
+
+
+# Static system prompt for summaries. The per-call parts (history, results, question)
+# go in the user prompt, after it, so the prefix stays cacheable.
+SUMMARY_SYSTEM_PROMPT = """You are a fitness data analyst. Answer the user's question based on the query results.
+
+Instructions:
+- Start with the direct answer (1-2 sentences)
+- Then provide 2-3 key insights or patterns you notice
+- Be specific with numbers and dates from the results
+- Use **bold** for important metrics, numbers, and key terms
+- Be concise and encouraging
+- Do NOT use section titles like "Answer:" or "Insights:"
+- Do NOT provide actionable recommendations
+- For follow-up questions, you may reference previous answers when relevant, but focus on answering the current question"""
+
+
+def build_summary_prompt(question: str, df: pd.DataFrame, conversation_history: List[ConversationTurn] = None) -> str:
+    """Build the per-call (user) part of the summary prompt."""
+    # Format results as CSV (limit to first 50 rows for context)
     if df.empty:
         results_preview = "No results found."
     else:
-        results_preview = df.head(50).to_markdown(index=False)
-        if len(df) > 50:
+        results_preview = format_preview(df, 50)
+        if df.attrs.get("truncated"):
+            results_preview += f"\n\n... (more than {MAX_RESULT_ROWS} rows; results truncated)"
+        elif len(df) > 50:
             results_preview += f"\n\n... ({len(df)} total rows)"
     
     # Build conversation context section
@@ -279,226 +575,352 @@ def summarize_results(question: str, sql: str, df: pd.DataFrame, llm_client, con
             context_parts.append(f"**A{i}:** {turn.summary[:200]}{'...' if len(turn.summary) > 200 else ''}\n")
         context_section = "\n".join(context_parts) + "\n"
     
-    prompt = f"""You are a fitness data analyst. Answer the user's question based on the query results.
-
-{context_section}User's question: "{question}"
-
-Query results:
+    followup_note = "\n(This is a follow-up question.)" if conversation_history else ""
+    
+    # History first, then this call's results, with the question last
+    return f"""{context_section}Query results (CSV):
 {results_preview}
 
-Instructions:
-- Start with the direct answer (1-2 sentences)
-- Then provide 2-3 key insights or patterns you notice
-- Be specific with numbers and dates from the results
-- Use **bold** for important metrics, numbers, and key terms
-- Be concise and encouraging
-- Do NOT use section titles like "Answer:" or "Insights:"
-- Do NOT provide actionable recommendations
-{f"- This is a follow-up question. You may reference previous answers when relevant, but focus on answering the current question." if conversation_history else ""}"""
-    
-    summary = llm_client.generate(prompt, temperature=0.3)
-    return summary
+User's question: "{question}"{followup_note}"""
 
 
-def generate_visualization_query(question: str, answer_sql: str, answer_df: pd.DataFrame, llm_client) -> Tuple[str, str]:
+def summarize_results(question: str, sql: str, df: pd.DataFrame, llm_client, conversation_history: List[ConversationTurn] = None) -> str:
     """
-    Use LLM to determine the best data to visualize for the answer, potentially creating a new query.
+    Use LLM to summarize query results and provide insights.
     
     Args:
-        question: User's natural language question
-        answer_sql: SQL query that answered the question
-        answer_df: DataFrame with the answer data
+        question: The user's question
+        sql: The SQL query that was executed
+        df: The result DataFrame
         llm_client: LLM client instance
+        conversation_history: Optional list of previous conversation turns for context
     
     Returns:
-        Tuple of (visualization_sql, chart_type_suggestion)
+        Summary text with insights
     """
-    if answer_df.empty:
-        return answer_sql, "table"
+    prompt = build_summary_prompt(question, df, conversation_history)
+    summary = llm_client.generate(prompt, temperature=0.3, system_prompt=SUMMARY_SYSTEM_PROMPT)
+    return summary
+
+
+def classify_columns(df: pd.DataFrame) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Split a DataFrame's columns into date/time, numeric and categorical in one pass.
     
-    # Get context about the answer
-    answer_preview = answer_df.head(10).to_markdown(index=False) if not answer_df.empty else "No data"
+    Equivalent to the name check plus two select_dtypes() calls, without
+    building intermediate frames; datetime columns count as date/time even if
+    their name doesn't say so (e.g. DATE_TRUNC(...) AS week).
     
-    prompt = f"""You are a data visualization expert. The user asked a question and we have the answer data.
-Now determine what data would BEST VISUALIZE and support this answer.
+    Returns:
+        Tuple of (date_cols, numeric_cols, categorical_cols)
+    """
+    date_cols, numeric_cols, categorical_cols = [], [], []
+    for col, dtype in zip(df.columns, df.dtypes):
+        kind = dtype.kind
+        name = str(col).lower()
+        if kind == 'M' or 'date' in name or 'time' in name:
+            date_cols.append(col)
+        if kind in 'iufc':
+            numeric_cols.append(col)
+        elif kind != 'M':
+            categorical_cols.append(col)
+    return date_cols, numeric_cols, categorical_cols
 
-User's question: "{question}"
 
-Current answer data (first 10 rows):
-{answer_preview}
+def default_chart_spec(df: pd.DataFrame) -> Dict[str, Any]:
+    """Fallback chart spec used when the LLM's spec is missing or unusable."""
+    columns = list(df.columns)
+    _, numeric_cols, _ = classify_columns(df)
+    return {
+        "chart_type": "bar" if len(df) <= 20 else "table",
+        "x_axis": columns[0] if columns else None,
+        "y_axis": numeric_cols[0] if numeric_cols else columns[1] if len(columns) > 1 else None,
+        "title": "Data Visualization"
+    }
 
-Current answer has: {len(answer_df)} rows, {len(answer_df.columns)} columns
 
-Available tables in database:
-- activities(date, start_time_utc, activity_type, distance_km, duration_min, avg_hr, max_hr, elevation_gain_m, avg_speed_kmh, calories)
-- sleep(date, sleep_start, sleep_end, sleep_duration_minutes, deep_sleep_minutes, light_sleep_minutes, rem_sleep_minutes, awake_minutes, sleep_score, avg_hr, lowest_hr)
-- daily_summary(date, steps, calories, resting_hr, min_hr, max_hr, stress_avg, body_battery_charged, body_battery_highest, body_battery_lowest, floors_climbed, distance_km)
+# Static system prompt for the combined visualization plan (viz query + chart spec in one call)
+VIZ_PLAN_SYSTEM_PROMPT = TABLES_COMPACT + """
+
+You are a data visualization expert. The user asked a question and we have the answer data.
+Decide what data would BEST VISUALIZE and support this answer, and how to chart it.
 
-Task: Suggest the BEST data to visualize for this answer. This might be:
+Data to visualize may be:
 1. The same query result if it's already suitable for visualization
 2. A modified or aggregated version (e.g., if answer is a single number, show the trend over time)
 3. A completely different query that provides supporting context
 
 Return a JSON object:
-{{
+{
   "use_same_query": true/false,
-  "new_sql": "PostgreSQL query to get visualization data (only if use_same_query is false)",
-  "suggested_chart_type": "line|bar|scatter|pie",
-  "reasoning": "Brief explanation of what to visualize and why"
-}}
+  "new_sql": "PostgreSQL query to get visualization data (empty if use_same_query is true)",
+  "chart": {
+    "chart_type": "line|bar|scatter|pie|table",
+    "x_axis": "column_name",
+    "y_axis": ["column_name", ...],
+    "title": "Descriptive chart title",
+    "color_by": "optional_column_name"
+  }
+}
 
-Examples:
-- If answer is "average is 5.2km", visualize the distribution or trend over time
-- If answer is a count, show a bar chart of the breakdown
-- If answer is comparing categories, show them side by side
-- If answer is about trends, show a line chart over time
+Guidelines:
+- Use "line" for time series or trends over dates
+- Use "bar" for comparisons between categories or counts
+- Use "scatter" for showing correlations between two numeric variables
+- Use "pie" for showing proportions or percentages (max 8 categories)
+- Use "table" only if data is not suitable for visualization
+- Chart axes must be exact column names of the data being visualized
+  (the answer data, or the columns selected by new_sql)
+- Make the title descriptive and specific to the data"""
 
-Return ONLY the JSON, no explanation."""
-    
-    try:
-        response = llm_client.generate(prompt, temperature=0.1)
-        
-        # Clean response
-        response = response.strip()
-        if response.startswith("```"):
-            lines = response.split("\n")
-            response = "\n".join([l for l in lines if not l.strip().startswith("```")])
-        response = response.strip()
-        
-        # Extract JSON
-        if "{" in response and "}" in response:
-            start = response.index("{")
-            end = response.rindex("}") + 1
-            response = response[start:end]
-        
-        viz_spec = json.loads(response)
-        
-        # Return appropriate SQL
-        if viz_spec.get("use_same_query", True):
-            return answer_sql, viz_spec.get("suggested_chart_type", "bar")
-        else:
-            new_sql = viz_spec.get("new_sql", "").strip()
-            if new_sql:
-                return new_sql, viz_spec.get("suggested_chart_type", "bar")
-            else:
-                return answer_sql, viz_spec.get("suggested_chart_type", "bar")
-    
-    except Exception as e:
-        print(f"Warning: Could not generate visualization query: {e}")
-        return answer_sql, "bar"
+
+VIZ_PLAN_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "use_same_query": {"type": "BOOLEAN"},
+        "new_sql": {"type": "STRING"},
+        "chart": {
+            "type": "OBJECT",
+            "properties": {
+                "chart_type": {"type": "STRING", "enum": ["line", "bar", "scatter", "pie", "table"]},
+                "x_axis": {"type": "STRING"},
+                "y_axis": {"type": "ARRAY", "items": {"type": "STRING"}},
+                "title": {"type": "STRING"},
+                "color_by": {"type": "STRING", "nullable": True},
+            },
+            "required": ["chart_type", "x_axis", "y_axis", "title"],
+        },
+    },
+    "required": ["use_same_query", "chart"],
+}
 
 
-def generate_chart_spec(question: str, sql: str, df: pd.DataFrame, llm_client, suggested_chart_type: str = None) -> Dict[str, Any]:
+def plan_visualization(question: str, answer_sql: str, answer_df: pd.DataFrame, llm_client) -> Tuple[str, Dict[str, Any]]:
     """
-    Use LLM to generate a chart specification based on the query and results.
+    Decide the visualization query and chart spec with a single structured LLM call.
+    
+    One request instead of separate visualization-query and chart-spec calls.
     
     Args:
         question: User's natural language question
-        sql: SQL query that was executed
-        df: DataFrame with query results
+        answer_sql: SQL query that answered the question
+        answer_df: DataFrame with the answer data
         llm_client: LLM client instance
     
     Returns:
-        Dictionary with chart specification:
-        {
-            "chart_type": "line|bar|scatter|pie|table",
-            "x_axis": "column_name",
-            "y_axis": "column_name" or ["col1", "col2"],
-            "title": "Chart title",
-            "color_by": "optional_column_name"
-        }
+        Tuple of (visualization_sql, chart_spec). The chart spec still has to be
+        checked against the visualization data with validate_chart_spec().
     """
-    if df.empty:
-        return {
-            "chart_type": "table",
-            "title": "No data to visualize"
-        }
+    if answer_df.empty:
+        return answer_sql, {"chart_type": "table", "title": "No data to visualize"}
     
-    # Get data info
-    columns = list(df.columns)
-    sample_data = df.head(3).to_dict('records')
-    data_shape = f"{len(df)} rows, {len(df.columns)} columns"
+    answer_preview = format_preview(answer_df, 10)
+    _, numeric_cols, _ = classify_columns(answer_df)
     
-    # Check for date/time columns
-    date_cols = [col for col in columns if 'date' in col.lower() or 'time' in col.lower()]
-    numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-    categorical_cols = df.select_dtypes(exclude=['number', 'datetime']).columns.tolist()
+    prompt = f"""User's question: "{question}"
+
+Current answer data (first 10 rows, CSV):
+{answer_preview}
+
+Current answer has: {len(answer_df)} rows, {len(answer_df.columns)} columns
+Numeric columns: {', '.join(numeric_cols) if numeric_cols else 'None'}"""
     
-    prompt = f"""Based on the user's question and the query results, suggest an appropriate data visualization.
+    try:
+        plan = llm_client.generate_structured(
+            prompt, schema=VIZ_PLAN_SCHEMA, temperature=0.1, system_prompt=VIZ_PLAN_SYSTEM_PROMPT,
+            model_tier="small"
+        )
+    except Exception as e:
+        print(f"Warning: Could not plan visualization: {e}")
+        return answer_sql, default_chart_spec(answer_df)
+    
+    viz_sql = answer_sql
+    new_sql = _extract_sql(plan.get("new_sql") or "")
+    if not plan.get("use_same_query", True) and new_sql:
+        viz_sql = new_sql
+    
+    return viz_sql, plan.get("chart") or {}
+
+
+# Static system prompt for writing the summary and the visualization plan in one call
+ANSWER_PLAN_SYSTEM_PROMPT = VIZ_PLAN_SYSTEM_PROMPT + """
 
-User's question: "{question}"
+In the same JSON object, also return a "summary" field: the answer to the user's question
+based on the query results, written for display as markdown.
 
-Data shape: {data_shape}
-Columns: {', '.join(columns)}
-Date/time columns: {', '.join(date_cols) if date_cols else 'None'}
-Numeric columns: {', '.join(numeric_cols) if numeric_cols else 'None'}
-Categorical columns: {', '.join(categorical_cols) if categorical_cols else 'None'}
+Summary instructions:
+- Start with the direct answer (1-2 sentences)
+- Then provide 2-3 key insights or patterns you notice
+- Be specific with numbers and dates from the results
+- Use **bold** for important metrics, numbers, and key terms
+- Be concise and encouraging
+- Do NOT use section titles like "Answer:" or "Insights:"
+- Do NOT provide actionable recommendations
+- For follow-up questions, you may reference previous answers when relevant, but focus on answering the current question"""
 
-Sample data (first 3 rows):
-{json.dumps(sample_data, indent=2, default=str)}
 
-{f"Suggested chart type: {suggested_chart_type}" if suggested_chart_type else ""}
+ANSWER_PLAN_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"summary": {"type": "STRING"}, **VIZ_PLAN_SCHEMA["properties"]},
+    "required": ["summary"] + VIZ_PLAN_SCHEMA["required"],
+}
 
-Choose the most appropriate visualization and return ONLY a JSON object with this structure:
-{{
-  "chart_type": "line|bar|scatter|pie|table",
-  "x_axis": "column_name",
-  "y_axis": "column_name_or_list",
-  "title": "Descriptive chart title",
-  "color_by": "optional_column_name"
-}}
 
-Guidelines:
-- Use "line" for time series or trends over dates
-- Use "bar" for comparisons between categories or counts
-- Use "scatter" for showing correlations between two numeric variables
-- Use "pie" for showing proportions or percentages (max 8 categories)
-- Use "table" only if data is not suitable for visualization
-- For x_axis and y_axis, use exact column names from the data
-- Make the title descriptive and specific to the data
-{f"- Prefer {suggested_chart_type} chart if appropriate" if suggested_chart_type else ""}
+def generate_viz_summary_chart(
+    question: str,
+    answer_sql: str,
+    answer_df: pd.DataFrame,
+    llm_client,
+    conversation_history: List[ConversationTurn] = None
+) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Write the summary and plan the visualization with a single structured LLM call.
+    
+    One request shares the prefill of the results between both outputs, instead
+    of sending them twice (summarize_results + plan_visualization).
+    
+    Args:
+        question: User's natural language question
+        answer_sql: SQL query that answered the question
+        answer_df: DataFrame with the answer data
+        llm_client: LLM client instance
+        conversation_history: Optional list of previous conversation turns for context
+    
+    Returns:
+        Tuple of (summary, visualization_sql, chart_spec), or None if the combined
+        response could not be produced (callers fall back to the separate calls)
+    """
+    if answer_df.empty:
+        return None
+    
+    _, numeric_cols, _ = classify_columns(answer_df)
+    prompt = f"""{build_summary_prompt(question, answer_df, conversation_history)}
 
-Return ONLY the JSON, no explanation."""
+Answer has: {len(answer_df)} rows, {len(answer_df.columns)} columns
+Numeric columns: {', '.join(numeric_cols) if numeric_cols else 'None'}"""
     
     try:
-        response = llm_client.generate(prompt, temperature=0.0)
-        
-        # Clean response
-        response = response.strip()
-        # Remove markdown code blocks if present
-        if response.startswith("```"):
-            lines = response.split("\n")
-            response = "\n".join([l for l in lines if not l.startswith("```")])
-        response = response.strip()
-        
-        # Parse JSON
-        chart_spec = json.loads(response)
-        
-        # Validate required fields
-        if "chart_type" not in chart_spec:
-            chart_spec["chart_type"] = "bar"
-        if "title" not in chart_spec:
-            chart_spec["title"] = "Data Visualization"
-        
-        return chart_spec
+        result = llm_client.generate_structured(
+            prompt, schema=ANSWER_PLAN_SCHEMA, temperature=0.3, system_prompt=ANSWER_PLAN_SYSTEM_PROMPT
+        )
+        summary = result["summary"].strip()
     except Exception as e:
-        print(f"Warning: Could not generate chart spec: {e}")
-        # Return default spec
-        return {
-            "chart_type": "bar" if len(df) <= 20 else "table",
-            "x_axis": columns[0] if columns else None,
-            "y_axis": numeric_cols[0] if numeric_cols else columns[1] if len(columns) > 1 else None,
-            "title": "Data Visualization"
-        }
+        print(f"Warning: Combined summary/visualization call failed: {e}")
+        return None
+    if not summary:
+        return None
+    
+    viz_sql = answer_sql
+    new_sql = _extract_sql(result.get("new_sql") or "")
+    if not result.get("use_same_query", True) and new_sql:
+        viz_sql = new_sql
+    
+    return summary, viz_sql, result.get("chart") or {}
+
+
+def validate_chart_spec(chart_spec: Dict[str, Any], df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Make sure a chart spec only references columns that exist in the data.
+    
+    Args:
+        chart_spec: Chart spec proposed by the LLM
+        df: DataFrame that will be charted
+    
+    Returns:
+        The chart spec (cleaned up), or a default spec if its axes don't match
+    """
+    if df.empty:
+        return {"chart_type": "table", "title": "No data to visualize"}
+    
+    chart_spec = dict(chart_spec)
+    chart_spec.setdefault("chart_type", "bar")
+    chart_spec.setdefault("title", "Data Visualization")
+    if chart_spec["chart_type"] == "table":
+        return chart_spec
+    
+    columns = set(df.columns)
+    y_axis = chart_spec.get("y_axis")
+    if isinstance(y_axis, list):
+        # Only line charts plot several y columns; the others take a single column
+        y_axis = [col for col in y_axis if col in columns]
+        if len(y_axis) == 1 or (y_axis and chart_spec["chart_type"] != "line"):
+            y_axis = y_axis[0]
+        chart_spec["y_axis"] = y_axis
+    if chart_spec.get("x_axis") not in columns or not y_axis or (isinstance(y_axis, str) and y_axis not in columns):
+        return {**default_chart_spec(df), "title": chart_spec["title"]}
+    if chart_spec.get("color_by") not in columns:
+        chart_spec.pop("color_by", None)
+    
+    return chart_spec
+
 
+def _quote_ident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
 
-def ask(question: str, verbose: bool = True) -> Tuple[str, pd.DataFrame, str]:
+
+def aggregate_line_sql(viz_sql: str, chart_spec: Dict[str, Any], df: pd.DataFrame) -> Optional[str]:
+    """
+    Wrap a long time-series visualization query in a date-bucketed aggregate.
+    
+    Applies to line charts with more than VIZ_LINE_MAX_POINTS rows whose x axis
+    holds dates and whose y columns are numeric. The bucket (day, week or month)
+    is the finest one that fits the query's full date span (computed in SQL, as
+    df itself may be capped at VIZ_ROW_LIMIT) into VIZ_LINE_MAX_POINTS points;
+    y values are averaged per bucket (and per color_by group).
+    
+    Args:
+        viz_sql: Visualization query that produced df
+        chart_spec: Validated chart spec for df
+        df: Visualization data
+    
+    Returns:
+        Aggregated SQL query, or None if the chart should use the rows as they are
+    """
+    import pandas as pd
+    
+    if chart_spec.get("chart_type") != "line" or len(df) <= VIZ_LINE_MAX_POINTS:
+        return None
+    
+    x_col = chart_spec["x_axis"]
+    y_cols = chart_spec["y_axis"] if isinstance(chart_spec["y_axis"], list) else [chart_spec["y_axis"]]
+    if pd.api.types.is_numeric_dtype(df[x_col]) or not all(
+        pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]) for col in y_cols
+    ):
+        return None
+    if pd.to_datetime(df[x_col], errors="coerce").isna().any():
+        return None
+    
+    x = _quote_ident(x_col)
+    span_days = f"MAX({x})::date - MIN({x})::date + 1"
+    keys = [f"DATE_TRUNC((SELECT unit FROM bucket), {x})::date AS {x}"]
+    color_by = chart_spec.get("color_by")
+    if color_by:
+        keys.append(_quote_ident(color_by))
+    averages = [f"AVG({_quote_ident(col)})::float8 AS {_quote_ident(col)}" for col in y_cols]
+    group_by = ", ".join(str(i) for i in range(1, len(keys) + 1))
+    return (
+        f"WITH viz AS ({as_subquery(viz_sql)}),\n"
+        f"bucket AS (\n"
+        f"    SELECT CASE WHEN {span_days} <= {VIZ_LINE_MAX_POINTS} THEN 'day'\n"
+        f"                WHEN {span_days} <= {VIZ_LINE_MAX_POINTS * 7} THEN 'week'\n"
+        f"                ELSE 'month' END AS unit\n"
+        f"    FROM viz\n"
+        f")\n"
+        f"SELECT {', '.join(keys + averages)}\n"
+        f"FROM viz\n"
+        f"GROUP BY {group_by}\n"
+        f"ORDER BY {group_by}"
+    )
+
+
+def ask(question: str, verbose: bool = True, llm_client=None) -> Tuple[str, pd.DataFrame, str]:
     """
     Main function: ask a question and get SQL, results, and insights.
     
     Args:
         question: Natural language question about Garmin data
         verbose: Whether to print intermediate steps
+        llm_client: Optional LLM client (defaults to the shared client)
     
     Returns:
         Tuple of (sql_query, results_dataframe, summary_text)
@@ -506,26 +928,31 @@ def ask(question: str, verbose: bool = True) -> Tuple[str, pd.DataFrame, str]:
     if verbose:
         print(f"\n🤔 Question: {question}\n")
     
-    # Check database connection
-    if not check_connection():
-        raise RuntimeError("Cannot connect to PostgreSQL. Make sure Docker is running: docker-compose up -d")
-    
     # Initialize
-    llm_client = create_llm_client("gemini")
+    if llm_client is None:
+        llm_client = get_llm_client()
     
-    # Generate SQL
-    if verbose:
-        print("🔧 Generating SQL query...")
-    sql = question_to_sql(question, llm_client)
+    # Generate SQL (or reuse the SQL of a near-identical earlier question)
+    cached = lookup_cached_sql(question, llm_client)
+    if cached:
+        sql = cached.sql
+        if verbose:
+            print(f"♻️  Reusing SQL from a similar question: \"{cached.question}\"")
+    else:
+        if verbose:
+            print("🔧 Generating SQL query...")
+        sql = question_to_sql(question, llm_client)
     if verbose:
         print(f"\n```sql\n{sql}\n```\n")
     
     # Execute query
     if verbose:
         print("📊 Executing query...")
-    df = run_sql(sql)
+    df = run_answer_sql(sql, get_data_version())
     if verbose:
         print(f"✓ Retrieved {len(df)} rows\n")
+    if not cached:
+        _background_executor.submit(store_cached_sql, question, sql, llm_client)
     
     # Generate insights
     if verbose:
@@ -540,47 +967,85 @@ def ask(question: str, verbose: bool = True) -> Tuple[str, pd.DataFrame, str]:
     return sql, df, summary
 
 
-def ask_with_chart(
-    question: str, 
-    conversation_history: List[ConversationTurn] = None,
-    verbose: bool = False
-) -> Tuple[str, pd.DataFrame, str, Dict[str, Any], pd.DataFrame, ConversationTurn]:
+def ask_many(questions: List[str], max_workers: int = 4) -> List[Tuple[str, pd.DataFrame, str]]:
     """
-    Ask a question and get SQL, results, insights, AND a chart specification.
-    Optimized for use in web interfaces. May generate a separate query for visualization.
-    Supports conversational context through conversation_history.
+    Answer several independent questions in one process (e.g. a weekly report).
+    
+    Shares one LLM client and database connection, and overlaps the LLM round
+    trips of different questions in a thread pool instead of running them
+    one after another.
     
     Args:
-        question: Natural language question about Garmin data
-        conversation_history: Optional list of previous conversation turns for context
-        verbose: Whether to print intermediate steps
+        questions: Natural language questions
+        max_workers: Maximum number of questions in flight at once
     
     Returns:
-        Tuple of (sql_query, results_dataframe, summary_text, chart_spec, viz_dataframe, conversation_turn)
-        The conversation_turn can be appended to conversation_history for the next question.
+        List of (sql_query, results_dataframe, summary_text), in input order.
+        A question that fails gets an empty DataFrame and the error as summary.
     """
-    # Check database connection
-    if not check_connection():
-        raise RuntimeError("Cannot connect to PostgreSQL. Make sure Docker is running: docker-compose up -d")
+    llm_client = get_llm_client()
     
-    # Initialize
-    llm_client = create_llm_client("gemini")
+    def answer(question: str) -> Tuple[str, pd.DataFrame, str]:
+        try:
+            return ask(question, verbose=False, llm_client=llm_client)
+        except Exception as e:
+            print(f"Warning: Question failed: {question}: {e}")
+            import pandas as pd
+            return "", pd.DataFrame(), f"✗ Error: {e}"
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(answer, questions))
+
+
+def _answer_sql(question: str, llm_client, conversation_history: Optional[List[ConversationTurn]],
+                verbose: bool) -> Tuple[Optional[CacheEntry], str]:
+    """
+    SQL for the answer: from the semantic cache for standalone questions, else from the LLM.
+    
+    Returns:
+        Tuple of (cache entry or None, answer_sql)
+    """
+    # Follow-ups depend on the conversation, so only standalone questions use the cache
+    cached = None if conversation_history else lookup_cached_sql(question, llm_client)
     
     # Generate SQL for the answer (with conversation context)
-    answer_sql = question_to_sql(question, llm_client, conversation_history)
+    if cached:
+        if verbose:
+            print(f"Reusing SQL from a similar question: \"{cached.question}\"")
+        return cached, cached.sql
+    return None, question_to_sql(question, llm_client, conversation_history)
+
+
+def _chart_for_answer(question: str, answer_sql: str, answer_df: pd.DataFrame, llm_client,
+                      cached: Optional[CacheEntry], conversation_history: Optional[List[ConversationTurn]],
+                      verbose: bool, plan: Optional[Tuple[str, Dict[str, Any]]] = None,
+                      data_version: Optional[int] = None) -> Tuple[Dict[str, Any], pd.DataFrame]:
+    """
+    Plan the chart for an answer and fetch its data.
     
-    # Execute answer query
-    answer_df = run_sql(answer_sql)
+    Args:
+        plan: (viz_sql, chart_spec) if already known (cache hit or combined call);
+            otherwise it is planned with one structured LLM call
+        data_version: Data version the answer query ran against (see run_sql)
     
-    # Determine best data to visualize (may generate a new query)
-    viz_sql, suggested_chart_type = generate_visualization_query(
-        question, answer_sql, answer_df, llm_client
-    )
+    Returns:
+        Tuple of (chart_spec, viz_dataframe)
+    """
+    cached_plan = cached is not None and "chart_spec" in cached.extra
+    
+    # Determine best data to visualize and how to chart it (one structured call;
+    # may generate a new query). A cache hit already carries the plan.
+    if cached_plan:
+        viz_sql, chart_spec = cached.extra["viz_sql"], cached.extra["chart_spec"]
+    elif plan is not None:
+        viz_sql, chart_spec = plan
+    else:
+        viz_sql, chart_spec = plan_visualization(question, answer_sql, answer_df, llm_client)
     
     # Get visualization data (might be different from answer data)
     if viz_sql != answer_sql:
         try:
-            viz_df = run_sql(viz_sql)
+            viz_df = run_sql(viz_sql, limit=VIZ_ROW_LIMIT, data_version=data_version)
             if verbose:
                 print(f"Using separate visualization query")
         except Exception as e:
@@ -590,13 +1055,93 @@ def ask_with_chart(
     else:
         viz_df = answer_df
     
-    # Generate chart specification for visualization data
-    chart_spec = generate_chart_spec(
-        question, viz_sql, viz_df, llm_client, suggested_chart_type
-    )
+    # Check the planned chart against the columns we actually got back
+    chart_spec = validate_chart_spec(chart_spec, viz_df)
+    
+    # Long time series are bucketed in the database instead of shipping every row
+    bucket_sql = aggregate_line_sql(viz_sql, chart_spec, viz_df)
+    if bucket_sql:
+        try:
+            viz_df = run_sql(bucket_sql, limit=VIZ_ROW_LIMIT, data_version=data_version)
+            if verbose:
+                print(f"Aggregated {len(viz_df)} chart points in SQL")
+        except Exception as e:
+            print(f"Chart aggregation query failed, using raw rows: {e}")
     
-    # Generate insights based on answer data (with conversation context)
-    summary = summarize_results(question, answer_sql, answer_df, llm_client, conversation_history)
+    if not conversation_history and not cached_plan:
+        _background_executor.submit(
+            store_cached_sql, question, answer_sql, llm_client, viz_sql=viz_sql, chart_spec=chart_spec
+        )
+    
+    return chart_spec, viz_df
+
+
+def ask_with_chart(
+    question: str, 
+    conversation_history: List[ConversationTurn] = None,
+    verbose: bool = False,
+    data_version: Optional[int] = None
+) -> Tuple[str, pd.DataFrame, str, Dict[str, Any], pd.DataFrame, ConversationTurn]:
+    """
+    Ask a question and get SQL, results, insights, AND a chart specification.
+    Optimized for use in web interfaces. May generate a separate query for visualization.
+    Supports conversational context through conversation_history.
+    
+    Args:
+        question: Natural language question about Garmin data
+        conversation_history: Optional list of previous conversation turns for context
+        verbose: Whether to print intermediate steps
+        data_version: Data version token for the result cache (e.g. one the caller
+            already has); read once here when not given
+    
+    Returns:
+        Tuple of (sql_query, results_dataframe, summary_text, chart_spec, viz_dataframe, conversation_turn)
+        The conversation_turn can be appended to conversation_history for the next question.
+    """
+    # Initialize
+    llm_client = get_llm_client()
+    
+    cached, answer_sql = _answer_sql(question, llm_client, conversation_history, verbose)
+    
+    # Execute answer query (one data version read serves every query of the question)
+    if data_version is None:
+        data_version = get_data_version()
+    answer_df = run_answer_sql(answer_sql, data_version)
+    
+    cached_plan = cached is not None and "chart_spec" in cached.extra
+    
+    # Optionally write the summary and plan the chart in one request (fewer
+    # provider calls); falls back to the separate calls below if it fails
+    combined = None
+    if COMBINE_ANSWER_CALLS and not cached_plan:
+        combined = generate_viz_summary_chart(
+            question, answer_sql, answer_df, llm_client, conversation_history
+        )
+    
+    # The summary only needs the answer data, so write it in the background while
+    # the visualization is planned and its query runs (both LLM calls are I/O bound).
+    # The sample rows kept for follow-ups are formatted alongside as well.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        sample_future = executor.submit(format_preview, answer_df, 5) if not answer_df.empty else None
+        plan = None
+        if combined:
+            summary_future = None
+            summary, viz_sql, chart_spec = combined
+            plan = (viz_sql, chart_spec)
+        else:
+            summary_future = executor.submit(
+                summarize_results, question, answer_sql, answer_df, llm_client, conversation_history
+            )
+        
+        chart_spec, viz_df = _chart_for_answer(
+            question, answer_sql, answer_df, llm_client, cached, conversation_history, verbose, plan,
+            data_version
+        )
+        
+        # Insights based on answer data (with conversation context)
+        if summary_future is not None:
+            summary = summary_future.result()
+        sample_data = sample_future.result() if sample_future is not None else None
     
     # Create conversation turn for this response
     conversation_turn = ConversationTurn.from_response(
@@ -604,13 +1149,71 @@ def ask_with_chart(
         sql=answer_sql,
         summary=summary,
         df=answer_df,
-        include_sample=True  # Always include sample for potential follow-ups
+        include_sample=True,  # Always include sample for potential follow-ups
+        sample_data=sample_data
     )
     
     # Return answer data, viz data, and conversation turn
     return answer_sql, answer_df, summary, chart_spec, viz_df, conversation_turn
 
 
+def ask_with_chart_stream(
+    question: str,
+    conversation_history: List[ConversationTurn] = None,
+    verbose: bool = False,
+    data_version: Optional[int] = None
+) -> Tuple[str, pd.DataFrame, Iterator[str], Callable[[str], Tuple[Dict[str, Any], pd.DataFrame, ConversationTurn]]]:
+    """
+    Like ask_with_chart, but the summary is streamed as the LLM writes it.
+    
+    The chart is planned (and its query run) in the background while the summary
+    streams. COMBINE_ANSWER_CALLS does not apply: the summary is always its own call.
+    
+    Args:
+        question: Natural language question about Garmin data
+        conversation_history: Optional list of previous conversation turns for context
+        verbose: Whether to print intermediate steps
+        data_version: Data version token for the result cache (see ask_with_chart)
+    
+    Returns:
+        Tuple of (sql_query, results_dataframe, summary_chunks, finish). Iterate
+        summary_chunks for the summary text as it arrives, then call
+        finish(summary_text) for (chart_spec, viz_dataframe, conversation_turn).
+    """
+    llm_client = get_llm_client()
+    
+    cached, answer_sql = _answer_sql(question, llm_client, conversation_history, verbose)
+    if data_version is None:
+        data_version = get_data_version()
+    answer_df = run_answer_sql(answer_sql, data_version)
+    
+    executor = ThreadPoolExecutor(max_workers=2)
+    sample_future = executor.submit(format_preview, answer_df, 5) if not answer_df.empty else None
+    chart_future = executor.submit(
+        _chart_for_answer, question, answer_sql, answer_df, llm_client, cached, conversation_history, verbose,
+        None, data_version
+    )
+    # Submitted work still runs to completion; this only releases the threads afterwards
+    executor.shutdown(wait=False)
+    
+    prompt = build_summary_prompt(question, answer_df, conversation_history)
+    summary_chunks = llm_client.stream(prompt, temperature=0.3, system_prompt=SUMMARY_SYSTEM_PROMPT)
+    
+    def finish(summary: str) -> Tuple[Dict[str, Any], pd.DataFrame, ConversationTurn]:
+        chart_spec, viz_df = chart_future.result()
+        conversation_turn = ConversationTurn.from_response(
+            question=question,
+            sql=answer_sql,
+            summary=summary,
+            df=answer_df,
+            include_sample=True,
+            sample_data=sample_future.result() if sample_future is not None else None
+        )
+        return chart_spec, viz_df, conversation_turn
+    
+    return answer_sql, answer_df, summary_chunks, finish
+
+
 def main():
     """CLI interface for AI explorer."""
     import argparse
@@ -623,9 +1226,15 @@ Examples:
   python -m src.ai_explorer "What is my average running distance in the last 30 days?"
   python -m src.ai_explorer "How does my sleep quality correlate with my running performance?"
   python -m src.ai_explorer "Show me my top 5 longest runs this year"
+  python -m src.ai_explorer --file weekly_questions.txt
         """
     )
-    parser.add_argument("question", type=str, help="Your question about Garmin data")
+    parser.add_argument("question", type=str, nargs="?", help="Your question about Garmin data")
+    parser.add_argument(
+        "--file",
+        type=str,
+        help="Answer every question in a text file (one per line, # for comments)"
+    )
     parser.add_argument(
         "--show-data",
         action="store_true",
@@ -634,22 +1243,42 @@ Examples:
     parser.add_argument(
         "--export",
         type=str,
-        help="Export results to CSV file"
+        help="Export results to CSV file (with --file, one file per question: name_1.csv, ...)"
     )
     
     args = parser.parse_args()
+    if not args.question and not args.file:
+        parser.error("provide a question or --file")
+    preload_heavy_modules()
     
     try:
-        sql, df, summary = ask(args.question, verbose=True)
-        
-        if args.show_data and not df.empty:
-            print("\n📋 Full Results:\n")
-            print(df.to_string(index=False))
+        if args.file:
+            lines = Path(args.file).read_text().splitlines()
+            questions = [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+            results = ask_many(questions)
+        else:
+            questions = [args.question]
+            results = [ask(args.question, verbose=True)]
         
-        if args.export:
-            export_path = Path(args.export)
-            df.to_csv(export_path, index=False)
-            print(f"\n💾 Results exported to {export_path}")
+        for i, (question, (sql, df, summary)) in enumerate(zip(questions, results), 1):
+            if args.file:
+                print(f"\n🤔 Question {i}: {question}\n")
+                print(f"```sql\n{sql}\n```\n")
+                print("=" * 80)
+                print(summary)
+                print("=" * 80)
+            
+            if args.show_data and not df.empty:
+                print("\n📋 Full Results:\n")
+                print(df.to_string(index=False))
+            
+            if args.export and sql:
+                export_path = Path(args.export)
+                if args.file:
+                    export_path = export_path.with_name(f"{export_path.stem}_{i}{export_path.suffix}")
+                # Stream the CSV from PostgreSQL instead of re-serializing the DataFrame
+                export_query_csv(sql, export_path)
+                print(f"\n💾 Results exported to {export_path}")
     
     except KeyboardInterrupt:
         print("\n\nInterrupted by user")
@@ -1,242 +1,207 @@
 """
 Backfill script to fetch all historical Garmin data into PostgreSQL.
 """
+from __future__ import annotations
+
+import os
 import sys
-from datetime import date, datetime, timedelta
-from typing import List, Dict, Any
-import pandas as pd
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from typing import Callable, List, Dict, Any, Optional, Tuple, TYPE_CHECKING
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-from .garmin_client import GarminClient
+# garminconnect and pandas (via .normalize) are imported where they are used, so
+# importing fetch_days (e.g. from a daily sync with nothing to do) stays cheap
+if TYPE_CHECKING:
+    from .garmin_client import GarminClient
+
 from .database import (
     init_schema,
     insert_activities,
     insert_sleep,
     insert_daily_summary,
-    check_connection
+    check_connection,
+    async_commit
 )
 
 
-def normalize_activities(activities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """
-    Normalize Garmin activities JSON into flat dictionaries.
-    """
-    rows = []
-    for act in activities:
-        try:
-            # Parse start time
-            start_time_str = act.get("startTimeLocal") or act.get("beginTimestamp")
-            if start_time_str:
-                if isinstance(start_time_str, str):
-                    # Handle various datetime formats
-                    for fmt in ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S.%f"]:
-                        try:
-                            start_time = datetime.strptime(start_time_str.split('.')[0], fmt)
-                            break
-                        except ValueError:
-                            continue
-                    else:
-                        # Try pandas parsing as fallback
-                        start_time = pd.to_datetime(start_time_str)
-                else:
-                    start_time = pd.to_datetime(start_time_str)
-            else:
-                continue  # Skip activities without timestamps
-            
-            row = {
-                "activity_id": str(act.get("activityId")),
-                "source": "garmin",
-                "start_time_utc": start_time,
-                "date": start_time.date(),
-                "activity_type": act.get("activityType", {}).get("typeKey") if isinstance(act.get("activityType"), dict) else act.get("activityType"),
-                "activity_name": act.get("activityName"),
-                "distance_km": act.get("distance", 0) / 1000 if act.get("distance") else None,  # meters to km
-                "duration_min": act.get("duration", 0) / 60 if act.get("duration") else None,  # seconds to minutes
-                "moving_time_min": act.get("movingDuration", 0) / 60 if act.get("movingDuration") else None,
-                "avg_hr": act.get("averageHR") or act.get("avgHr"),
-                "max_hr": act.get("maxHR") or act.get("maxHr"),
-                "elevation_gain_m": act.get("elevationGain"),
-                "avg_speed_kmh": act.get("averageSpeed") * 3.6 if act.get("averageSpeed") else None,  # m/s to km/h
-                "calories": act.get("calories"),
-            }
-            rows.append(row)
-        except Exception as e:
-            print(f"Warning: Failed to normalize activity {act.get('activityId')}: {e}")
-            continue
-    
-    return rows
+# Records (activities or days) buffered before each normalize + database write
+FLUSH_ROWS = 500
 
 
-def normalize_sleep(sleep_data: Dict[str, Any], query_date: date) -> List[Dict[str, Any]]:
-    """
-    Normalize Garmin sleep data into flat dictionaries.
-    """
-    if not sleep_data or "dailySleepDTO" not in sleep_data:
-        return []
+def backfill_activities(gc: Optional[GarminClient] = None):
+    """Fetch all activities and write to database (gc: optional client to reuse)."""
+    from .garmin_client import get_client
+    from .normalize import normalize_activities
     
-    daily = sleep_data["dailySleepDTO"]
-    
-    try:
-        # Parse timestamps
-        sleep_start_str = daily.get("sleepStartTimestampLocal")
-        sleep_end_str = daily.get("sleepEndTimestampLocal")
-        
-        if sleep_start_str and sleep_end_str:
-            sleep_start = pd.to_datetime(sleep_start_str)
-            sleep_end = pd.to_datetime(sleep_end_str)
-        else:
-            return []
-        
-        # Extract sleep stages
-        sleep_levels = daily.get("sleepLevels", {})
-        deep_sleep_sec = 0
-        light_sleep_sec = 0
-        rem_sleep_sec = 0
-        awake_sec = 0
-        
-        for level_data in sleep_levels.values():
-            if isinstance(level_data, list):
-                for entry in level_data:
-                    duration = entry.get("seconds", 0)
-                    if "deep" in str(entry).lower():
-                        deep_sleep_sec += duration
-                    elif "light" in str(entry).lower():
-                        light_sleep_sec += duration
-                    elif "rem" in str(entry).lower():
-                        rem_sleep_sec += duration
-                    elif "awake" in str(entry).lower():
-                        awake_sec += duration
-        
-        row = {
-            "date": query_date,
-            "sleep_start": sleep_start,
-            "sleep_end": sleep_end,
-            "sleep_duration_minutes": daily.get("sleepTimeSeconds", 0) / 60,
-            "deep_sleep_minutes": deep_sleep_sec / 60,
-            "light_sleep_minutes": light_sleep_sec / 60,
-            "rem_sleep_minutes": rem_sleep_sec / 60,
-            "awake_minutes": awake_sec / 60,
-            "sleep_score": daily.get("sleepScores", {}).get("overall", {}).get("value") if daily.get("sleepScores") else None,
-            "avg_hr": daily.get("averageHeartRate"),
-            "lowest_hr": daily.get("lowestHeartRate"),
-            "avg_respiration": daily.get("averageRespirationValue"),
-        }
-        return [row]
-    except Exception as e:
-        print(f"Warning: Failed to normalize sleep data for {query_date}: {e}")
-        return []
-
-
-def normalize_daily_stats(stats: Dict[str, Any], query_date: date) -> List[Dict[str, Any]]:
-    """
-    Normalize Garmin daily stats/summary into flat dictionaries.
-    """
-    if not stats:
-        return []
-    
-    try:
-        row = {
-            "date": query_date,
-            "steps": stats.get("totalSteps") or stats.get("steps"),
-            "calories": stats.get("activeKilocalories") or stats.get("calories"),
-            "resting_hr": stats.get("restingHeartRate"),
-            "min_hr": stats.get("minHeartRate"),
-            "max_hr": stats.get("maxHeartRate"),
-            "stress_avg": stats.get("averageStressLevel"),
-            "body_battery_charged": stats.get("bodyBatteryChargedValue"),
-            "body_battery_drained": stats.get("bodyBatteryDrainedValue"),
-            "body_battery_highest": stats.get("bodyBatteryHighestValue"),
-            "body_battery_lowest": stats.get("bodyBatteryLowestValue"),
-            "floors_climbed": stats.get("floorsAscended"),
-            "distance_km": stats.get("totalDistanceMeters", 0) / 1000 if stats.get("totalDistanceMeters") else None,
-        }
-        return [row]
-    except Exception as e:
-        print(f"Warning: Failed to normalize daily stats for {query_date}: {e}")
-        return []
-
-
-def backfill_activities():
-    """Fetch all activities and write to database."""
     print("\n=== Backfilling Activities ===")
-    gc = GarminClient()
+    gc = gc or get_client()
     activities = gc.get_all_activities()
     
     if not activities:
         print("No activities found")
         return
     
-    rows = normalize_activities(activities)
-    if not rows:
+    # Normalize and write in batches so only one batch of rows is held at a time
+    normalized = 0
+    count = 0
+    for i in range(0, len(activities), FLUSH_ROWS):
+        rows = normalize_activities(activities[i:i + FLUSH_ROWS])
+        normalized += len(rows)
+        count += insert_activities(rows)
+    
+    if not normalized:
         print("No activities to write after normalization")
         return
     
-    count = insert_activities(rows)
-    print(f"✓ Inserted {count} activities (total normalized: {len(rows)})")
+    print(f"✓ Inserted {count} activities (total normalized: {normalized})")
 
 
-def backfill_sleep(start_date: date, end_date: date):
-    """Fetch sleep data for a date range and write to database."""
-    print(f"\n=== Backfilling Sleep ({start_date} to {end_date}) ===")
-    gc = GarminClient()
+# Per-day endpoints are fetched concurrently; the calls are network-bound, so
+# threads overlap the round trips (the GIL is released while waiting on sockets)
+FETCH_WORKERS = int(os.environ.get("GARMIN_FETCH_WORKERS", "8"))
+FETCH_RETRIES = 3
+
+
+def date_range(start_date: date, end_date: date) -> List[date]:
+    """Every day from start_date to end_date (inclusive), via ordinal arithmetic."""
+    return list(map(date.fromordinal, range(start_date.toordinal(), end_date.toordinal() + 1)))
+
+
+def _fetch_with_retry(fetch: Callable[[str], Any], date_str: str) -> Any:
+    """Call a per-day Garmin endpoint, retrying with exponential backoff."""
+    for attempt in range(FETCH_RETRIES):
+        try:
+            return fetch(date_str)
+        except Exception:
+            if attempt == FETCH_RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def fetch_days(
+    fetch: Callable[[str], Any],
+    normalize: Callable[[List[Tuple[Any, date]]], List[Dict[str, Any]]],
+    write: Callable[[List[Dict[str, Any]]], int],
+    start_date: date,
+    end_date: date,
+    max_workers: int = FETCH_WORKERS,
+    flush_rows: int = FLUSH_ROWS
+) -> Tuple[int, int]:
+    """
+    Fetch, normalize and write one Garmin endpoint for every day in a range.
+    
+    Responses are buffered and normalized together (one DataFrame per batch
+    instead of one per day), then written, every flush_rows days, so memory
+    stays bounded however long the range is.
     
-    cur = start_date
-    all_rows = []
+    Args:
+        fetch: Client method taking a YYYY-MM-DD string (e.g. gc.get_sleep_data)
+        normalize: Batch normalizer taking (response, date) pairs (e.g. normalize_sleep_batch)
+        write: Insert function for the rows (e.g. insert_sleep)
+        start_date: First day to fetch
+        end_date: Last day to fetch (inclusive)
+        max_workers: Number of requests in flight at once
+        flush_rows: Number of days to buffer before writing
     
-    while cur <= end_date:
+    Returns:
+        Tuple of (rows normalized, rows written)
+    """
+    days = date_range(start_date, end_date)
+    date_strs = [day.isoformat() for day in days]
+    pending: List[Tuple[Any, date]] = []
+    statuses: List[Tuple[date, str]] = []
+    normalized = 0
+    written = 0
+    
+    def report():
+        # Per-day status lines are printed in one write per batch, in date order
+        print("\n".join(line for _, line in sorted(statuses)))
+        statuses.clear()
+    
+    def flush():
+        nonlocal normalized, written
+        report()
         try:
-            sleep_data = gc.get_sleep_data(cur.isoformat())
-            rows = normalize_sleep(sleep_data, cur)
-            all_rows.extend(rows)
+            rows = normalize(pending)
+        except Exception:
+            # A malformed response fails the whole batch; retry day by day so
+            # only the bad days are skipped
+            rows = []
+            for item in pending:
+                try:
+                    rows.extend(normalize([item]))
+                except Exception as e:
+                    print(f"Warning: Failed to normalize {item[1]}: {e}")
+        normalized += len(rows)
+        written += write(rows)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_fetch_with_retry, fetch, date_str): day
+            for day, date_str in zip(days, date_strs)
+        }
+        for future in as_completed(futures):
+            day = futures.pop(future)
+            try:
+                response = future.result()
+                pending.append((response, day))
+                
+                if response:
+                    statuses.append((day, f"  ✓ {day}"))
+                else:
+                    statuses.append((day, f"  - {day} (no data)"))
+            except Exception as e:
+                statuses.append((day, f"  ✗ {day}: {e}"))
             
-            if rows:
-                print(f"  ✓ {cur}")
-            else:
-                print(f"  - {cur} (no data)")
-        except Exception as e:
-            print(f"  ✗ {cur}: {e}")
-        
-        cur += timedelta(days=1)
+            if len(pending) >= flush_rows:
+                flush()
+                pending = []
     
-    if not all_rows:
+    if pending:
+        flush()
+    elif statuses:
+        report()
+    return normalized, written
+
+
+def backfill_sleep(start_date: date, end_date: date, gc: Optional[GarminClient] = None):
+    """Fetch sleep data for a date range and write to database (gc: optional client to reuse)."""
+    from .garmin_client import get_client
+    from .normalize import normalize_sleep_batch
+    
+    print(f"\n=== Backfilling Sleep ({start_date} to {end_date}) ===")
+    gc = gc or get_client()
+    
+    normalized, count = fetch_days(gc.get_sleep_data, normalize_sleep_batch, insert_sleep, start_date, end_date)
+    
+    if not normalized:
         print("No sleep data found")
         return
     
-    count = insert_sleep(all_rows)
     print(f"✓ Inserted {count} sleep records")
 
 
-def backfill_daily_summary(start_date: date, end_date: date):
-    """Fetch daily summary/stats for a date range and write to database."""
-    print(f"\n=== Backfilling Daily Summary ({start_date} to {end_date}) ===")
-    gc = GarminClient()
+def backfill_daily_summary(start_date: date, end_date: date, gc: Optional[GarminClient] = None):
+    """Fetch daily summary/stats for a date range and write to database (gc: optional client to reuse)."""
+    from .garmin_client import get_client
+    from .normalize import normalize_daily_stats_batch
     
-    cur = start_date
-    all_rows = []
+    print(f"\n=== Backfilling Daily Summary ({start_date} to {end_date}) ===")
+    gc = gc or get_client()
     
-    while cur <= end_date:
-        try:
-            stats = gc.get_daily_stats(cur.isoformat())
-            rows = normalize_daily_stats(stats, cur)
-            all_rows.extend(rows)
-            
-            if rows:
-                print(f"  ✓ {cur}")
-            else:
-                print(f"  - {cur} (no data)")
-        except Exception as e:
-            print(f"  ✗ {cur}: {e}")
-        
-        cur += timedelta(days=1)
+    normalized, count = fetch_days(
+        gc.get_daily_stats, normalize_daily_stats_batch, insert_daily_summary, start_date, end_date
+    )
     
-    if not all_rows:
+    if not normalized:
         print("No daily summary data found")
         return
     
-    count = insert_daily_summary(all_rows)
     print(f"✓ Inserted {count} daily summary records")
 
 
@@ -283,16 +248,21 @@ def main():
     # Initialize schema
     init_schema()
     
-    # Run backfills
+    # Run backfills (one login and HTTP session shared by all of them)
     try:
-        if "activities" in args.entities:
-            backfill_activities()
+        from .garmin_client import get_client
+        gc = get_client()
         
-        if "sleep" in args.entities:
-            backfill_sleep(start_date, end_date)
-        
-        if "daily_summary" in args.entities:
-            backfill_daily_summary(start_date, end_date)
+        # Bulk load: don't wait for a WAL flush on every batch commit
+        with async_commit():
+            if "activities" in args.entities:
+                backfill_activities(gc)
+            
+            if "sleep" in args.entities:
+                backfill_sleep(start_date, end_date, gc)
+            
+            if "daily_summary" in args.entities:
+                backfill_daily_summary(start_date, end_date, gc)
         
         print("\n✓ Backfill complete!")
     except KeyboardInterrupt:
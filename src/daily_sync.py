@@ -2,28 +2,29 @@
 Daily sync script for incremental Garmin data updates.
 Automatically detects the latest date in the database and syncs only new data.
 """
+from __future__ import annotations
+
 import sys
 from datetime import date, timedelta
-from typing import List, Dict, Any, Optional
-import pandas as pd
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-from .garmin_client import GarminClient
-from .backfill import (
-    normalize_activities, 
-    normalize_sleep, 
-    normalize_daily_stats,
-)
+# garminconnect and pandas (via .normalize) are imported inside the sync functions,
+# after the "already up to date" checks, so a no-op sync never loads them
+if TYPE_CHECKING:
+    from .garmin_client import GarminClient
+
+from .backfill import fetch_days
 from .database import (
     init_schema,
     insert_activities,
     insert_sleep,
     insert_daily_summary,
     get_latest_date,
-    get_existing_activity_ids,
+    get_new_activity_ids,
     check_connection
 )
 
@@ -42,15 +43,15 @@ def deduplicate_activities(new_activities: List[Dict[str, Any]]) -> List[Dict[st
         return []
     
     try:
-        # Get existing activity IDs from database
-        existing_ids = get_existing_activity_ids()
+        # Anti-join the candidate IDs against the database
+        new_ids = get_new_activity_ids([act['activity_id'] for act in new_activities])
         
-        if not existing_ids:
-            print(f"  No existing activities in database, all {len(new_activities)} activities are new")
+        if len(new_ids) == len(new_activities):
+            print(f"  None of the {len(new_activities)} activities are in the database yet, all are new")
             return new_activities
         
         # Filter out existing activities
-        truly_new = [act for act in new_activities if act['activity_id'] not in existing_ids]
+        truly_new = [act for act in new_activities if act['activity_id'] in new_ids]
         
         duplicates_count = len(new_activities) - len(truly_new)
         if duplicates_count > 0:
@@ -64,7 +65,11 @@ def deduplicate_activities(new_activities: List[Dict[str, Any]]) -> List[Dict[st
         return new_activities
 
 
-def sync_activities(lookback_days: int = 30) -> int:
+def sync_activities(
+    lookback_days: int = 30,
+    today: Optional[date] = None,
+    gc: Optional[GarminClient] = None
+) -> int:
     """
     Sync activities, deduplicating against existing data.
     
@@ -73,21 +78,28 @@ def sync_activities(lookback_days: int = 30) -> int:
     
     Args:
         lookback_days: Minimum days to look back (default 30, extended if needed)
+        today: Reference date for the run (defaults to date.today())
+        gc: Client to reuse (defaults to the shared process-wide client)
     
     Returns:
         Number of new activities added
     """
+    today = today or date.today()
+    
     # Smart lookback: extend if last sync was before the default window
     latest = get_latest_date("activities")
     if latest:
-        days_since_last = (date.today() - date.fromisoformat(latest)).days
+        days_since_last = (today - latest).days
         if days_since_last > lookback_days:
             print(f"Last activity sync was {days_since_last} days ago, extending lookback")
             lookback_days = days_since_last + 1  # +1 to include the last synced day
     
     print(f"\n=== Syncing Activities (lookback: {lookback_days} days) ===")
     
-    gc = GarminClient()
+    from .garmin_client import get_client
+    from .normalize import normalize_activities
+    
+    gc = gc or get_client()
     
     # Fetch recent activities
     # Note: Garmin API doesn't support date filtering well, so we fetch a batch
@@ -98,20 +110,17 @@ def sync_activities(lookback_days: int = 30) -> int:
         print("No activities found from API")
         return 0
     
-    # Normalize activities
-    rows = normalize_activities(activities)
-    
-    if not rows:
-        print("No activities to process after normalization")
-        return 0
-    
-    # Filter to only activities within lookback period
-    cutoff_date = date.today() - timedelta(days=lookback_days)
-    rows = [r for r in rows if r['date'] >= cutoff_date]
+    # Normalize only the activities within the lookback period
+    cutoff_date = today - timedelta(days=lookback_days)
+    rows = normalize_activities(activities, since=cutoff_date)
     print(f"Found {len(rows)} activities in the last {lookback_days} days")
     
-    # Deduplicate against existing data
-    rows = deduplicate_activities(rows)
+    # Deduplicate against existing data, unless every fetched activity is newer
+    # than the latest stored one (then none of them can already exist)
+    if rows and (latest is None or latest < min(r['date'] for r in rows)):
+        print(f"  All {len(rows)} activities are newer than {latest or 'the empty table'}, skipping dedup")
+    else:
+        rows = deduplicate_activities(rows)
     
     if not rows:
         print("✓ No new activities to add")
@@ -124,25 +133,32 @@ def sync_activities(lookback_days: int = 30) -> int:
     return count
 
 
-def sync_sleep(start_date: Optional[date] = None, end_date: Optional[date] = None) -> int:
+def sync_sleep(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    today: Optional[date] = None,
+    gc: Optional[GarminClient] = None
+) -> int:
     """
     Sync sleep data incrementally.
     
     Args:
         start_date: Start date (defaults to latest date in database + 1 day)
         end_date: End date (defaults to today)
+        today: Reference date for the run (defaults to date.today())
+        gc: Client to reuse (defaults to the shared process-wide client)
     
     Returns:
         Number of new sleep records added
     """
     # Determine date range
     if end_date is None:
-        end_date = date.today()
+        end_date = today or date.today()
     
     if start_date is None:
         latest = get_latest_date("sleep")
         if latest:
-            start_date = date.fromisoformat(latest) + timedelta(days=1)
+            start_date = latest + timedelta(days=1)
         else:
             # No existing data, fetch last 7 days
             start_date = end_date - timedelta(days=7)
@@ -154,42 +170,37 @@ def sync_sleep(start_date: Optional[date] = None, end_date: Optional[date] = Non
     
     print(f"\n=== Syncing Sleep ({start_date} to {end_date}) ===")
     
-    gc = GarminClient()
-    cur = start_date
-    all_rows = []
-    
-    while cur <= end_date:
-        try:
-            sleep_data = gc.get_sleep_data(cur.isoformat())
-            rows = normalize_sleep(sleep_data, cur)
-            all_rows.extend(rows)
-            
-            if rows:
-                print(f"  ✓ {cur}")
-            else:
-                print(f"  - {cur} (no data)")
-        except Exception as e:
-            print(f"  ✗ {cur}: {e}")
-        
-        cur += timedelta(days=1)
+    from .garmin_client import get_client
+    from .normalize import normalize_sleep_batch
+    
+    gc = gc or get_client()
+    
+    # Days are fetched concurrently and written in batches (shared with the backfill)
+    normalized, count = fetch_days(gc.get_sleep_data, normalize_sleep_batch, insert_sleep, start_date, end_date)
     
-    if not all_rows:
+    if not normalized:
         print("✓ No new sleep data found")
         return 0
     
-    count = insert_sleep(all_rows)
     print(f"✓ Added {count} sleep records")
     
     return count
 
 
-def sync_daily_summary(start_date: Optional[date] = None, end_date: Optional[date] = None) -> int:
+def sync_daily_summary(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    today: Optional[date] = None,
+    gc: Optional[GarminClient] = None
+) -> int:
     """
     Sync daily summary data incrementally.
     
     Args:
         start_date: Start date (defaults to latest date in database + 1 day)
         end_date: End date (defaults to yesterday, since today is incomplete)
+        today: Reference date for the run (defaults to date.today())
+        gc: Client to reuse (defaults to the shared process-wide client)
     
     Returns:
         Number of new daily summary records added
@@ -197,12 +208,12 @@ def sync_daily_summary(start_date: Optional[date] = None, end_date: Optional[dat
     # Determine date range
     if end_date is None:
         # Use yesterday since today's data might be incomplete
-        end_date = date.today() - timedelta(days=1)
+        end_date = (today or date.today()) - timedelta(days=1)
     
     if start_date is None:
         latest = get_latest_date("daily_summary")
         if latest:
-            start_date = date.fromisoformat(latest) + timedelta(days=1)
+            start_date = latest + timedelta(days=1)
         else:
             # No existing data, fetch last 7 days
             start_date = end_date - timedelta(days=7)
@@ -214,30 +225,20 @@ def sync_daily_summary(start_date: Optional[date] = None, end_date: Optional[dat
     
     print(f"\n=== Syncing Daily Summary ({start_date} to {end_date}) ===")
     
-    gc = GarminClient()
-    cur = start_date
-    all_rows = []
-    
-    while cur <= end_date:
-        try:
-            stats = gc.get_daily_stats(cur.isoformat())
-            rows = normalize_daily_stats(stats, cur)
-            all_rows.extend(rows)
-            
-            if rows:
-                print(f"  ✓ {cur}")
-            else:
-                print(f"  - {cur} (no data)")
-        except Exception as e:
-            print(f"  ✗ {cur}: {e}")
-        
-        cur += timedelta(days=1)
+    from .garmin_client import get_client
+    from .normalize import normalize_daily_stats_batch
+    
+    gc = gc or get_client()
+    
+    # Days are fetched concurrently and written in batches (shared with the backfill)
+    normalized, count = fetch_days(
+        gc.get_daily_stats, normalize_daily_stats_batch, insert_daily_summary, start_date, end_date
+    )
     
-    if not all_rows:
+    if not normalized:
         print("✓ No new daily summary data found")
         return 0
     
-    count = insert_daily_summary(all_rows)
     print(f"✓ Added {count} daily summary records")
     
     return count
@@ -322,18 +323,19 @@ Examples:
     else:
         print(f"End date: Today (or yesterday for daily_summary)")
     
-    # Run syncs
+    # Run syncs (one reference date for all entities, even if the run crosses midnight)
     total_new = 0
+    today = date.today()
     
     try:
         if "activities" in args.entities:
-            total_new += sync_activities(lookback_days=args.activity_lookback)
+            total_new += sync_activities(lookback_days=args.activity_lookback, today=today)
         
         if "sleep" in args.entities:
-            total_new += sync_sleep(start_date_override, end_date_override)
+            total_new += sync_sleep(start_date_override, end_date_override, today)
         
         if "daily_summary" in args.entities:
-            total_new += sync_daily_summary(start_date_override, end_date_override)
+            total_new += sync_daily_summary(start_date_override, end_date_override, today)
         
         print("\n" + "=" * 80)
         print(f"✓ Sync complete! Added {total_new} total new records")
@@ -2,14 +2,26 @@
 PostgreSQL database module for Garmin data storage.
 Handles connection management, schema creation, and data operations.
 """
+from __future__ import annotations
+
+import io
 import os
+import re
+import threading
+from datetime import date
 from contextlib import contextmanager
-from typing import List, Dict, Any, Optional, Generator
-import pandas as pd
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Generator, TYPE_CHECKING
 import psycopg2
-from psycopg2.extras import execute_values, RealDictCursor
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 
+# pandas is only needed by execute_query, so it is imported there
+if TYPE_CHECKING:
+    import pandas as pd
+
 load_dotenv()
 
 
@@ -24,14 +36,165 @@ def get_connection_params() -> Dict[str, str]:
     }
 
 
+# Pool of read-write connections for schema setup, inserts and maintenance
+# (created lazily), so a sync doesn't reconnect for every insert/probe
+_write_pool: Optional[ThreadedConnectionPool] = None
+_write_slots: Optional[threading.BoundedSemaphore] = None
+_write_pool_lock = threading.Lock()
+
+
+def _get_write_pool() -> ThreadedConnectionPool:
+    """Create the read-write connection pool on first use."""
+    global _write_pool, _write_slots
+    if _write_pool is None:
+        with _write_pool_lock:
+            if _write_pool is None:
+                max_size = int(os.environ.get("PG_POOL_MAX", "4"))
+                pool = ThreadedConnectionPool(1, max_size, **get_connection_params())
+                # ThreadedConnectionPool raises instead of waiting when exhausted
+                _write_slots = threading.BoundedSemaphore(max_size)
+                _write_pool = pool
+    return _write_pool
+
+
 @contextmanager
 def get_connection() -> Generator[psycopg2.extensions.connection, None, None]:
-    """Context manager for database connections."""
-    conn = psycopg2.connect(**get_connection_params())
-    try:
-        yield conn
-    finally:
-        conn.close()
+    """
+    Context manager for pooled read-write database connections.
+    
+    The connection goes back to the pool afterwards (an open transaction is
+    rolled back by the pool); one that hit a connection-level error is
+    discarded instead.
+    """
+    pool = _get_write_pool()
+    with _write_slots:
+        conn = pool.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if not conn.closed and conn.autocommit:
+                conn.autocommit = False
+            pool.putconn(conn, close=broken or bool(conn.closed))
+
+
+def close_write_pool():
+    """Close all pooled read-write connections (the pool is recreated on next use)."""
+    global _write_pool
+    with _write_pool_lock:
+        if _write_pool is not None:
+            _write_pool.closeall()
+        _write_pool = None
+
+
+def get_query_session_options() -> str:
+    """
+    Session settings for explorer queries, passed as libpq startup options
+    (applied during connect, no extra round trips).
+    
+    - work_mem: lets aggregations/sorts over the history stay in memory
+    - jit=off: JIT compilation costs more than it saves on these small queries
+    - statement_timeout: a runaway generated query can't hang the app
+    - default_transaction_read_only: generated SQL can never modify data
+    """
+    work_mem = os.environ.get("PG_QUERY_WORK_MEM", "64MB")
+    statement_timeout = os.environ.get("PG_QUERY_TIMEOUT", "30s")
+    return (
+        f"-c work_mem={work_mem} -c jit=off "
+        f"-c statement_timeout={statement_timeout} "
+        f"-c default_transaction_read_only=on"
+    )
+
+
+# NUMERIC results (AVG(), SUM() of REAL columns, ROUND(...)) arrive as Decimal by default,
+# which pandas stores as boxed object columns. Cast them straight to float instead.
+DEC2FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    "DEC2FLOAT",
+    lambda value, cursor: float(value) if value is not None else None,
+)
+
+# Pool of connections for read-only explorer queries (created lazily). Concurrent
+# questions (ask_many, several Streamlit sessions) each check out their own
+# connection instead of queueing on a single shared one.
+_query_pool: Optional[ThreadedConnectionPool] = None
+_query_slots: Optional[threading.BoundedSemaphore] = None
+_query_pool_lock = threading.Lock()
+
+
+def _get_query_pool() -> ThreadedConnectionPool:
+    """Create the query connection pool on first use."""
+    global _query_pool, _query_slots
+    if _query_pool is None:
+        with _query_pool_lock:
+            if _query_pool is None:
+                max_size = int(os.environ.get("PG_QUERY_POOL_SIZE", "10"))
+                try:
+                    pool = ThreadedConnectionPool(
+                        1, max_size, **get_connection_params(), options=get_query_session_options()
+                    )
+                except psycopg2.OperationalError as e:
+                    raise ConnectionError(
+                        f"Cannot connect to PostgreSQL. Make sure Docker is running: docker-compose up -d\n{e}"
+                    ) from e
+                # ThreadedConnectionPool raises instead of waiting when exhausted
+                _query_slots = threading.BoundedSemaphore(max_size)
+                _query_pool = pool
+    return _query_pool
+
+
+@contextmanager
+def query_connection() -> Generator[psycopg2.extensions.connection, None, None]:
+    """
+    Check out a pooled connection for read-only explorer queries.
+    
+    Connections stay open between questions, so repeated ask() calls skip the
+    connect/auth handshake. They run in autocommit mode so a failing query
+    never leaves the session stuck in an aborted transaction, and return
+    NUMERIC values as floats so result columns come back as float64 rather
+    than object. A connection that hit a connection-level error is discarded
+    instead of being returned to the pool.
+    
+    Raises:
+        ConnectionError: If PostgreSQL is unreachable
+    """
+    pool = _get_query_pool()
+    with _query_slots:
+        try:
+            conn = pool.getconn()
+        except psycopg2.OperationalError as e:
+            raise ConnectionError(
+                f"Cannot connect to PostgreSQL. Make sure Docker is running: docker-compose up -d\n{e}"
+            ) from e
+        if not conn.autocommit:
+            conn.autocommit = True
+            psycopg2.extensions.register_type(DEC2FLOAT, conn)
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            pool.putconn(conn, close=broken or bool(conn.closed))
+
+
+def close_query_pool():
+    """Close all pooled query connections (the pool is recreated on next use)."""
+    global _query_pool
+    with _query_pool_lock:
+        if _query_pool is not None:
+            _query_pool.closeall()
+        _query_pool = None
+
+
+def close_pools():
+    """Close both connection pools, e.g. at the end of a sync task."""
+    close_write_pool()
+    close_query_pool()
 
 
 @contextmanager
@@ -110,7 +273,10 @@ CREATE TABLE IF NOT EXISTS daily_summary (
 
 -- Indexes for common queries
 CREATE INDEX IF NOT EXISTS idx_activities_date ON activities(date);
-CREATE INDEX IF NOT EXISTS idx_activities_type ON activities(activity_type);
+-- (activity_type, date) serves "my runs in the last N days"/"latest runs" without a
+-- sort and also covers activity_type-only filters, replacing idx_activities_type
+CREATE INDEX IF NOT EXISTS idx_activities_type_date ON activities(activity_type, date DESC);
+DROP INDEX IF EXISTS idx_activities_type;
 CREATE INDEX IF NOT EXISTS idx_sleep_date ON sleep(date);
 CREATE INDEX IF NOT EXISTS idx_daily_summary_date ON daily_summary(date);
 """
@@ -123,12 +289,131 @@ def init_schema():
     print("✓ Database schema initialized")
 
 
+# Column order of each table's insert, declared once (rows are dicts keyed by column)
+ACTIVITY_COLUMNS = (
+    "activity_id", "source", "start_time_utc", "date", "activity_type",
+    "activity_name", "distance_km", "duration_min", "moving_time_min",
+    "avg_hr", "max_hr", "elevation_gain_m", "avg_speed_kmh", "calories",
+)
+SLEEP_COLUMNS = (
+    "date", "sleep_start", "sleep_end", "sleep_duration_minutes",
+    "deep_sleep_minutes", "light_sleep_minutes", "rem_sleep_minutes",
+    "awake_minutes", "sleep_score", "avg_hr", "lowest_hr", "avg_respiration",
+)
+DAILY_SUMMARY_COLUMNS = (
+    "date", "steps", "calories", "resting_hr", "min_hr", "max_hr",
+    "stress_avg", "body_battery_charged", "body_battery_drained",
+    "body_battery_highest", "body_battery_lowest", "floors_climbed", "distance_km",
+)
+
+
+def _staging_table(table: str) -> str:
+    return f"{table}_staging"
+
+
+def _upsert_sql(table: str, columns: tuple, conflict_key: str, update: bool = True) -> str:
+    """Build the INSERT ... SELECT ... ON CONFLICT statement that moves staged rows into a table."""
+    column_list = ", ".join(columns)
+    sql = (
+        f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {_staging_table(table)} "
+        f"ON CONFLICT ({conflict_key}) "
+    )
+    if not update:
+        return sql + "DO NOTHING"
+    # Re-fetched days are usually unchanged; skip those rows instead of writing
+    # an identical new row version (and index entries) for each
+    updated = [column for column in columns if column != conflict_key]
+    return (
+        sql + "DO UPDATE SET "
+        + ", ".join(f"{column} = EXCLUDED.{column}" for column in updated)
+        + f" WHERE ({', '.join(f'{table}.{column}' for column in updated)})"
+        + f" IS DISTINCT FROM ({', '.join(f'EXCLUDED.{column}' for column in updated)})"
+    )
+
+
+# Row dict -> value tuple in column order (rows from .normalize carry every column)
+_ACTIVITY_VALUES = itemgetter(*ACTIVITY_COLUMNS)
+_SLEEP_VALUES = itemgetter(*SLEEP_COLUMNS)
+_DAILY_SUMMARY_VALUES = itemgetter(*DAILY_SUMMARY_COLUMNS)
+
+# Insert statements, built once from the column tuples above
+ACTIVITY_INSERT_SQL = _upsert_sql("activities", ACTIVITY_COLUMNS, "activity_id", update=False)
+SLEEP_INSERT_SQL = _upsert_sql("sleep", SLEEP_COLUMNS, "date")
+DAILY_SUMMARY_INSERT_SQL = _upsert_sql("daily_summary", DAILY_SUMMARY_COLUMNS, "date")
+
+# Characters that must be escaped in COPY text format
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_value(value: Any) -> str:
+    """Format one value for COPY text format (NULL is \\N)."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return value.translate(_COPY_ESCAPES)
+    return str(value)
+
+
+# Set inside async_commit(): insert transactions then commit without waiting for WAL flush
+_async_commit = False
+
+
+@contextmanager
+def async_commit():
+    """
+    Commit inserts made inside the block with synchronous_commit=off.
+    
+    Commits return before their WAL is flushed to disk, so a bulk load isn't
+    bound by fsync latency. A server crash can lose the last few commits
+    (never corrupt data), which is fine for a backfill that can simply be
+    re-run; incremental syncs should not use this.
+    """
+    global _async_commit
+    previous, _async_commit = _async_commit, True
+    try:
+        yield
+    finally:
+        _async_commit = previous
+
+
+def _insert_rows(table: str, columns: tuple, insert_sql: str, values: List[tuple]) -> int:
+    """
+    Bulk-load rows with COPY into a temporary staging table, then upsert them
+    into the target table with a single INSERT ... SELECT, in one transaction.
+    
+    COPY streams all rows in one round trip and skips per-row statement
+    parsing; the staging step keeps the ON CONFLICT semantics COPY lacks.
+    
+    Returns:
+        Number of rows inserted/updated
+    """
+    staging = _staging_table(table)
+    column_list = ", ".join(columns)
+    buffer = io.StringIO()
+    buffer.writelines("\t".join(map(_copy_value, row)) + "\n" for row in values)
+    buffer.seek(0)
+    
+    with get_cursor() as cursor:
+        if _async_commit:
+            cursor.execute("SET LOCAL synchronous_commit = off")
+        # Same column types as the target, but no constraints or defaults (no SERIAL draws)
+        cursor.execute(
+            f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+            f"SELECT {column_list} FROM {table} WITH NO DATA"
+        )
+        cursor.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN", buffer)
+        cursor.execute(insert_sql)
+        written = cursor.rowcount
+    get_latest_date.cache_clear()
+    return written
+
+
 def insert_activities(activities: List[Dict[str, Any]]) -> int:
     """
     Insert activities into the database using upsert (ON CONFLICT DO NOTHING).
     
     Args:
-        activities: List of activity dictionaries
+        activities: List of activity dictionaries (with every ACTIVITY_COLUMNS key)
     
     Returns:
         Number of rows inserted
@@ -136,26 +421,8 @@ def insert_activities(activities: List[Dict[str, Any]]) -> int:
     if not activities:
         return 0
     
-    columns = [
-        "activity_id", "source", "start_time_utc", "date", "activity_type",
-        "activity_name", "distance_km", "duration_min", "moving_time_min",
-        "avg_hr", "max_hr", "elevation_gain_m", "avg_speed_kmh", "calories"
-    ]
-    
-    # Prepare values
-    values = []
-    for act in activities:
-        values.append(tuple(act.get(col) for col in columns))
-    
-    insert_sql = f"""
-        INSERT INTO activities ({', '.join(columns)})
-        VALUES %s
-        ON CONFLICT (activity_id) DO NOTHING
-    """
-    
-    with get_cursor() as cursor:
-        execute_values(cursor, insert_sql, values)
-        return cursor.rowcount
+    values = list(map(_ACTIVITY_VALUES, activities))
+    return _insert_rows("activities", ACTIVITY_COLUMNS, ACTIVITY_INSERT_SQL, values)
 
 
 def insert_sleep(sleep_records: List[Dict[str, Any]]) -> int:
@@ -163,7 +430,7 @@ def insert_sleep(sleep_records: List[Dict[str, Any]]) -> int:
     Insert sleep records into the database using upsert.
     
     Args:
-        sleep_records: List of sleep dictionaries
+        sleep_records: List of sleep dictionaries (with every SLEEP_COLUMNS key)
     
     Returns:
         Number of rows inserted/updated
@@ -171,37 +438,9 @@ def insert_sleep(sleep_records: List[Dict[str, Any]]) -> int:
     if not sleep_records:
         return 0
     
-    columns = [
-        "date", "sleep_start", "sleep_end", "sleep_duration_minutes",
-        "deep_sleep_minutes", "light_sleep_minutes", "rem_sleep_minutes",
-        "awake_minutes", "sleep_score", "avg_hr", "lowest_hr", "avg_respiration"
-    ]
-    
-    values = []
-    for record in sleep_records:
-        values.append(tuple(record.get(col) for col in columns))
-    
     # Upsert: update if date already exists
-    insert_sql = f"""
-        INSERT INTO sleep ({', '.join(columns)})
-        VALUES %s
-        ON CONFLICT (date) DO UPDATE SET
-            sleep_start = EXCLUDED.sleep_start,
-            sleep_end = EXCLUDED.sleep_end,
-            sleep_duration_minutes = EXCLUDED.sleep_duration_minutes,
-            deep_sleep_minutes = EXCLUDED.deep_sleep_minutes,
-            light_sleep_minutes = EXCLUDED.light_sleep_minutes,
-            rem_sleep_minutes = EXCLUDED.rem_sleep_minutes,
-            awake_minutes = EXCLUDED.awake_minutes,
-            sleep_score = EXCLUDED.sleep_score,
-            avg_hr = EXCLUDED.avg_hr,
-            lowest_hr = EXCLUDED.lowest_hr,
-            avg_respiration = EXCLUDED.avg_respiration
-    """
-    
-    with get_cursor() as cursor:
-        execute_values(cursor, insert_sql, values)
-        return cursor.rowcount
+    values = list(map(_SLEEP_VALUES, sleep_records))
+    return _insert_rows("sleep", SLEEP_COLUMNS, SLEEP_INSERT_SQL, values)
 
 
 def insert_daily_summary(summaries: List[Dict[str, Any]]) -> int:
@@ -209,7 +448,7 @@ def insert_daily_summary(summaries: List[Dict[str, Any]]) -> int:
     Insert daily summary records into the database using upsert.
     
     Args:
-        summaries: List of daily summary dictionaries
+        summaries: List of daily summary dictionaries (with every DAILY_SUMMARY_COLUMNS key)
     
     Returns:
         Number of rows inserted/updated
@@ -217,113 +456,217 @@ def insert_daily_summary(summaries: List[Dict[str, Any]]) -> int:
     if not summaries:
         return 0
     
-    columns = [
-        "date", "steps", "calories", "resting_hr", "min_hr", "max_hr",
-        "stress_avg", "body_battery_charged", "body_battery_drained",
-        "body_battery_highest", "body_battery_lowest", "floors_climbed", "distance_km"
-    ]
-    
-    values = []
-    for summary in summaries:
-        values.append(tuple(summary.get(col) for col in columns))
-    
     # Upsert: update if date already exists
-    insert_sql = f"""
-        INSERT INTO daily_summary ({', '.join(columns)})
-        VALUES %s
-        ON CONFLICT (date) DO UPDATE SET
-            steps = EXCLUDED.steps,
-            calories = EXCLUDED.calories,
-            resting_hr = EXCLUDED.resting_hr,
-            min_hr = EXCLUDED.min_hr,
-            max_hr = EXCLUDED.max_hr,
-            stress_avg = EXCLUDED.stress_avg,
-            body_battery_charged = EXCLUDED.body_battery_charged,
-            body_battery_drained = EXCLUDED.body_battery_drained,
-            body_battery_highest = EXCLUDED.body_battery_highest,
-            body_battery_lowest = EXCLUDED.body_battery_lowest,
-            floors_climbed = EXCLUDED.floors_climbed,
-            distance_km = EXCLUDED.distance_km
-    """
-    
-    with get_cursor() as cursor:
-        execute_values(cursor, insert_sql, values)
-        return cursor.rowcount
+    values = list(map(_DAILY_SUMMARY_VALUES, summaries))
+    return _insert_rows("daily_summary", DAILY_SUMMARY_COLUMNS, DAILY_SUMMARY_INSERT_SQL, values)
+
 
+# Latest-date query per table, built once (also restricts table to known names)
+LATEST_DATE_SQL = {
+    table: f"SELECT MAX(date) FROM {table}"
+    for table in ("activities", "sleep", "daily_summary")
+}
 
-def get_latest_date(table: str) -> Optional[str]:
+
+@lru_cache(maxsize=8)
+def get_latest_date(table: str) -> Optional[date]:
     """
     Get the most recent date in a table.
     
+    Results are memoized per process and cleared whenever this process
+    writes rows, so repeated sync runs in one process skip the query.
+    
     Args:
         table: Table name ('activities', 'sleep', or 'daily_summary')
     
     Returns:
-        Latest date as ISO string, or None if table is empty
+        Latest date (the DATE column as-is), or None if table is empty
     """
-    with get_cursor() as cursor:
-        cursor.execute(f"SELECT MAX(date) FROM {table}")
+    with query_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(LATEST_DATE_SQL[table])
         result = cursor.fetchone()
-        if result and result[0]:
-            return result[0].isoformat()
-        return None
+        return result[0] if result else None
 
 
-def get_existing_activity_ids() -> set:
-    """Get all existing activity IDs from the database."""
-    with get_cursor() as cursor:
-        cursor.execute("SELECT activity_id FROM activities")
+def get_new_activity_ids(activity_ids: List[str]) -> set:
+    """
+    Find which of the given activity IDs are not in the database yet.
+    
+    The IDs are sent as one array parameter and anti-joined against the
+    primary key inside PostgreSQL, so only the (usually small) set of new
+    IDs comes back instead of every stored ID.
+    
+    Args:
+        activity_ids: Candidate activity IDs
+    
+    Returns:
+        The subset of activity_ids with no row in the activities table
+    """
+    if not activity_ids:
+        return set()
+    
+    with query_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT new_ids.id
+            FROM unnest(%s::varchar[]) AS new_ids(id)
+            WHERE NOT EXISTS (SELECT 1 FROM activities a WHERE a.activity_id = new_ids.id)
+        """, (list(activity_ids),))
         return {row[0] for row in cursor.fetchall()}
 
 
-def execute_query(sql: str) -> pd.DataFrame:
+# A trailing ';' on the last line, optionally followed by a '--' comment
+_TRAILING_SEMICOLON = re.compile(r";\s*(?:--.*)?$")
+
+
+def as_subquery(sql: str) -> str:
+    """
+    Prepare a query to be wrapped in parentheses (LIMIT wrapper, COPY, aggregates).
+    
+    Trailing comment-only lines and a trailing ';' (with any comment after it)
+    are removed, and the query is returned on its own lines so a '--' comment
+    at its end can't swallow the closing parenthesis.
+    
+    Args:
+        sql: SQL query string
+    
+    Returns:
+        The query surrounded by newlines, ready for f"({as_subquery(sql)})"
+    """
+    lines = sql.rstrip().splitlines()
+    while lines:
+        last = lines[-1].strip()
+        if not last or last.startswith("--"):
+            lines.pop()
+        elif _TRAILING_SEMICOLON.search(last):
+            lines[-1] = _TRAILING_SEMICOLON.sub("", lines[-1]).rstrip()
+        else:
+            break
+    return "\n" + "\n".join(lines) + "\n"
+
+
+def execute_query(sql: str, limit: Optional[int] = None) -> pd.DataFrame:
     """
     Execute a SQL query and return results as a DataFrame.
     
     Args:
         sql: SQL query string
+        limit: Optional row cap, pushed into the query so PostgreSQL stops
+            producing (and transferring) rows beyond it
     
     Returns:
         Query results as pandas DataFrame
     """
-    with get_connection() as conn:
-        return pd.read_sql(sql, conn)
+    import pandas as pd
+    
+    if limit is not None:
+        sql = f"SELECT * FROM ({as_subquery(sql)}) AS limited_query LIMIT {int(limit)}"
+    # Plain cursor fetch: pd.read_sql adds its own per-call SQL layer (and a
+    # warning) on top of a raw DB-API connection
+    with query_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(sql)
+        columns = [column.name for column in cursor.description or []]
+        return pd.DataFrame.from_records(cursor.fetchall() if columns else [], columns=columns)
+
+
+def export_query_csv(sql: str, path) -> None:
+    """
+    Write the full result of a query to a CSV file using COPY ... TO STDOUT.
+    
+    PostgreSQL formats the CSV server-side and psycopg2 streams it straight
+    into the file, so large exports never go through a DataFrame.
+    
+    Args:
+        sql: SQL query string
+        path: Destination CSV file path
+    """
+    with open(path, "w", newline="") as f, query_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.copy_expert(f"COPY ({as_subquery(sql)}) TO STDOUT WITH (FORMAT CSV, HEADER)", f)
+
+
+def get_data_version() -> int:
+    """
+    Get a token that changes whenever rows are written to any table.
+    
+    Reads cumulative insert/update/delete counters from pg_stat_user_tables,
+    a cheap catalog view, so callers can cache query results and have them
+    invalidated by the next sync (from any process) without a TTL guess.
+    
+    The counters are statistics, not a transaction log: backends flush them
+    asynchronously, so a sync that just committed may not be visible for a
+    moment, and pg_stat_reset() sets them back to zero, so a value can repeat
+    after a reset. Cache entries keyed on it should keep a TTL as a backstop.
+    """
+    with query_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0)::bigint
+            FROM pg_stat_user_tables
+        """)
+        return cursor.fetchone()[0]
 
 
 def get_table_stats() -> Dict[str, Dict[str, Any]]:
     """
-    Get statistics for all tables (count, date range).
+    Get statistics for all tables (count, date range), in one round trip.
     
     Returns:
         Dictionary with stats for each table
     """
     stats = {}
     tables = ['activities', 'sleep', 'daily_summary']
+    sql = " UNION ALL ".join(
+        f"SELECT '{table}', COUNT(*), MIN(date), MAX(date) FROM {table}" for table in tables
+    )
     
-    with get_cursor() as cursor:
-        for table in tables:
-            cursor.execute(f"""
-                SELECT 
-                    COUNT(*) as count,
-                    MIN(date) as min_date,
-                    MAX(date) as max_date
-                FROM {table}
-            """)
-            result = cursor.fetchone()
-            if result:
-                stats[table] = {
-                    'count': result[0],
-                    'min_date': result[1],
-                    'max_date': result[2]
-                }
+    with query_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(sql)
+        for table, count, min_date, max_date in cursor.fetchall():
+            stats[table] = {
+                'count': count,
+                'min_date': min_date,
+                'max_date': max_date
+            }
     
     return stats
 
 
+# Date index per table, used to keep each table physically ordered by date
+DATE_INDEXES = {
+    'activities': 'idx_activities_date',
+    'sleep': 'idx_sleep_date',
+    'daily_summary': 'idx_daily_summary_date',
+}
+
+
+def compact_tables(tables: Optional[List[str]] = None):
+    """
+    Rewrite tables in date order and refresh planner statistics.
+    
+    Daily upserts append new row versions at the end of the heap and leave
+    dead tuples behind, so over time a date-range query touches pages spread
+    across the whole table. CLUSTER rewrites each table ordered by its date
+    index (dropping dead tuples), and ANALYZE refreshes the statistics the
+    planner uses to choose index range scans.
+    
+    Args:
+        tables: Tables to compact. Defaults to all tables.
+    """
+    tables = tables or list(DATE_INDEXES)
+    
+    # CLUSTER/ANALYZE of several tables can't share one transaction block
+    with get_connection() as conn:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f"CLUSTER {table} USING {DATE_INDEXES[table]}")
+                cursor.execute(f"ANALYZE {table}")
+                print(f"✓ Compacted {table}")
+
+
 def check_connection() -> bool:
-    """Check if database connection is working."""
+    """Check if database connection is working (uses a pooled connection)."""
     try:
-        with get_cursor() as cursor:
+        with query_connection() as conn, conn.cursor() as cursor:
             cursor.execute("SELECT 1")
             return True
     except Exception as e:
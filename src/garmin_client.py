@@ -2,11 +2,19 @@
 Wrapper around garminconnect library with session persistence.
 """
 import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, List, Dict, Any
-from datetime import date, datetime, timedelta
 from garminconnect import Garmin
-import garth
+
+# Cached sessions are reused without a validation call until this many
+# seconds before the OAuth2 token expires
+SESSION_EXPIRY_MARGIN = 300
+# Stored next to the garth tokens in the session directory
+PROFILE_FILE = "profile.json"
 
 
 class GarminClient:
@@ -34,24 +42,35 @@ class GarminClient:
         self._login()
     
     def _login(self):
-        """Login to Garmin Connect, using cached session if available."""
+        """
+        Login to Garmin Connect, using the cached session if available.
+        
+        If the cached OAuth2 token is still valid, the session is restored
+        without any network call. An expired token is refreshed by loading
+        the session through Garmin.login (garth renews it from the long-lived
+        OAuth1 token); only if that fails do we log in with credentials.
+        """
         print("Logging into Garmin Connect...")
         
-        # Try to load existing session from garth
+        # Try to restore the saved garth session into the Garmin instance
         try:
-            garth.resume(str(self.session_dir))
-            # Create Garmin instance (it will use the resumed garth session)
             self.api = Garmin()
-            # Test if session is still valid by making a simple API call
-            try:
-                self.api.get_heart_rates(date.today().isoformat())
+            self.api.garth.load(str(self.session_dir))
+            
+            token = self.api.garth.oauth2_token
+            display_name = self._load_display_name()
+            if display_name and token.expires_at - SESSION_EXPIRY_MARGIN > time.time():
+                self.api.display_name = display_name
                 print("✓ Loaded existing session")
                 return
-            except:
-                # Session expired, need fresh login
-                print("Cached session expired, logging in again...")
-        except Exception as e:
-            print(f"No valid cached session, performing fresh login...")
+            
+            # Token (nearly) expired: refresh it and the profile through the API
+            self.api.login(str(self.session_dir))
+            self._save_session()
+            print("✓ Refreshed existing session")
+            return
+        except Exception:
+            print("No valid cached session, performing fresh login...")
         
         # Fresh login
         try:
@@ -59,13 +78,24 @@ class GarminClient:
             self.api = Garmin(self.email, self.password)
             # Perform login
             self.api.login()
-            # Save the garth session for next time
-            garth.save(str(self.session_dir))
+            # Save the session for next time
+            self._save_session()
             print("✓ Logged in successfully")
         except Exception as e:
             print(f"Login failed: {e}")
             raise
     
+    def _save_session(self):
+        """Save the garth tokens and the display name (needed by most endpoints)."""
+        self.api.garth.dump(str(self.session_dir))
+        (self.session_dir / PROFILE_FILE).write_text(json.dumps({"display_name": self.api.display_name}))
+    
+    def _load_display_name(self) -> Optional[str]:
+        try:
+            return json.loads((self.session_dir / PROFILE_FILE).read_text()).get("display_name")
+        except (OSError, ValueError):
+            return None
+    
     def get_activities(self, start: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Get activities with pagination.
@@ -79,12 +109,16 @@ class GarminClient:
         """
         return self.api.get_activities(start, limit)
     
-    def get_all_activities(self, max_activities: int = 10000) -> List[Dict[str, Any]]:
+    def get_all_activities(self, max_activities: int = 10000, max_workers: int = 4) -> List[Dict[str, Any]]:
         """
         Fetch all activities by paginating through the API.
         
+        Pages are requested max_workers at a time (the total count isn't known
+        up front, so each wave goes as far as the first short page).
+        
         Args:
             max_activities: Safety limit to prevent infinite loops
+            max_workers: Number of pages fetched concurrently
         
         Returns:
             List of all activity dictionaries
@@ -94,17 +128,23 @@ class GarminClient:
         start = 0
         
         print("Fetching activities...")
-        while start < max_activities:
-            batch = self.get_activities(start, batch_size)
-            if not batch:
-                break
-            all_activities.extend(batch)
-            print(f"  Fetched {len(all_activities)} activities...")
-            start += batch_size
-            
-            # Stop if we got fewer than requested (no more data)
-            if len(batch) < batch_size:
-                break
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while start < max_activities:
+                starts = range(start, min(start + batch_size * max_workers, max_activities), batch_size)
+                batches = executor.map(lambda page_start: self.get_activities(page_start, batch_size), starts)
+                
+                finished = False
+                for batch in batches:
+                    all_activities.extend(batch)
+                    # Stop at the first page shorter than requested (no more data)
+                    if len(batch) < batch_size:
+                        finished = True
+                        break
+                print(f"  Fetched {len(all_activities)} activities...")
+                
+                if finished:
+                    break
+                start += batch_size * len(starts)
         
         print(f"✓ Total activities fetched: {len(all_activities)}")
         return all_activities
@@ -144,3 +184,14 @@ class GarminClient:
             Heart rate data dictionary
         """
         return self.api.get_heart_rates(date_str)
+
+
+@lru_cache(maxsize=1)
+def get_client() -> GarminClient:
+    """
+    Get the process-wide GarminClient (logs in once, shared by all syncs and backfills).
+    
+    garth refreshes an expired OAuth2 token on the next request, so the shared
+    client stays usable for the life of the process.
+    """
+    return GarminClient()
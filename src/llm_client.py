@@ -3,8 +3,9 @@ LLM client abstraction layer.
 Currently implements Gemini, but designed to easily swap providers.
 """
 import os
+import orjson
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Optional, Dict, Any, List, Tuple, Iterator
 import google.generativeai as genai
 
 
@@ -12,29 +13,147 @@ class LLMClient(ABC):
     """Base class for LLM providers."""
     
     @abstractmethod
-    def generate(self, prompt: str, temperature: float = 0.0) -> str:
-        """Generate text from a prompt."""
+    def generate(self, prompt: str, temperature: float = 0.0, system_prompt: Optional[str] = None,
+                 model_tier: str = "large") -> str:
+        """
+        Generate text from a prompt.
+        
+        Args:
+            prompt: The per-call (dynamic) part of the request
+            temperature: Sampling temperature
+            system_prompt: Optional static instructions. Keep this byte-identical
+                across calls so providers can serve it from their prefix cache.
+            model_tier: "large" for SQL generation and summaries, "small" for
+                cheap routing decisions (e.g. picking a chart). Providers with a
+                single model can ignore it.
+        """
         pass
+    
+    def stream(self, prompt: str, temperature: float = 0.0, system_prompt: Optional[str] = None,
+               model_tier: str = "large") -> Iterator[str]:
+        """
+        Generate text from a prompt, yielding chunks as they arrive.
+        
+        Providers without streaming support yield the whole response at once.
+        Arguments are the same as generate().
+        """
+        yield self.generate(prompt, temperature=temperature, system_prompt=system_prompt,
+                            model_tier=model_tier)
+    
+    def generate_structured(self, prompt: str, schema: Optional[Dict[str, Any]] = None,
+                            temperature: float = 0.0, system_prompt: Optional[str] = None,
+                            model_tier: str = "large") -> Dict[str, Any]:
+        """
+        Generate a JSON object from a prompt.
+        
+        Providers with native structured output should override this; the
+        default falls back to generate() and parses the JSON from the text.
+        
+        Args:
+            prompt: The per-call (dynamic) part of the request
+            schema: Optional response schema (OpenAPI-style dict)
+            temperature: Sampling temperature
+            system_prompt: Optional static instructions
+            model_tier: "large" or "small" (see generate)
+        
+        Returns:
+            Parsed JSON object
+        """
+        text = self.generate(prompt, temperature=temperature, system_prompt=system_prompt,
+                             model_tier=model_tier).strip()
+        if "{" in text and "}" in text:
+            text = text[text.index("{"):text.rindex("}") + 1]
+        return orjson.loads(text)
+    
+    def embed(self, text: str) -> List[float]:
+        """
+        Embed a text for semantic similarity (used by the semantic cache).
+        
+        Providers without an embedding endpoint leave this unimplemented,
+        which simply disables semantic caching.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support embeddings")
 
 
 class GeminiClient(LLMClient):
     """Google Gemini implementation."""
     
-    def __init__(self, api_key: Optional[str] = None, model_name: str = "gemini-2.0-flash"):
+    def __init__(self, api_key: Optional[str] = None, model_name: str = "gemini-2.0-flash",
+                 small_model_name: str = "gemini-2.0-flash-lite",
+                 embedding_model: str = "models/text-embedding-004"):
         self.api_key = api_key or os.environ.get("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found in environment")
         
         genai.configure(api_key=self.api_key)
+        self.model_name = model_name
+        self.model_names = {"large": model_name, "small": small_model_name}
+        self.embedding_model = embedding_model
         self.model = genai.GenerativeModel(model_name)
+        # One model handle per (tier, system prompt), so the static prefix is
+        # sent as system_instruction and hits Gemini's implicit prefix cache
+        self._system_models: Dict[Tuple[str, Optional[str]], genai.GenerativeModel] = {}
+        # Plain-text generation configs by temperature (only a few temperatures are used)
+        self._generation_configs: Dict[float, genai.types.GenerationConfig] = {}
     
-    def generate(self, prompt: str, temperature: float = 0.0) -> str:
+    def _generation_config(self, temperature: float) -> genai.types.GenerationConfig:
+        """Get the text generation config for a temperature (created once per value)."""
+        config = self._generation_configs.get(temperature)
+        if config is None:
+            config = genai.types.GenerationConfig(temperature=temperature)
+            self._generation_configs[temperature] = config
+        return config
+    
+    def _get_model(self, system_prompt: Optional[str], model_tier: str = "large") -> genai.GenerativeModel:
+        """Get the model handle for a tier and system prompt (created once per pair)."""
+        if not system_prompt and model_tier == "large":
+            return self.model
+        key = (model_tier, system_prompt)
+        model = self._system_models.get(key)
+        if model is None:
+            model = genai.GenerativeModel(self.model_names[model_tier], system_instruction=system_prompt)
+            self._system_models[key] = model
+        return model
+    
+    def generate(self, prompt: str, temperature: float = 0.0, system_prompt: Optional[str] = None,
+                 model_tier: str = "large") -> str:
         """Generate text using Gemini."""
+        generation_config = self._generation_config(temperature)
+        model = self._get_model(system_prompt, model_tier)
+        response = model.generate_content(prompt, generation_config=generation_config)
+        return response.text
+    
+    def stream(self, prompt: str, temperature: float = 0.0, system_prompt: Optional[str] = None,
+               model_tier: str = "large") -> Iterator[str]:
+        """Stream text chunks from Gemini as they are generated."""
+        generation_config = self._generation_config(temperature)
+        model = self._get_model(system_prompt, model_tier)
+        response = model.generate_content(prompt, generation_config=generation_config, stream=True)
+        for chunk in response:
+            if chunk.parts:
+                yield chunk.text
+    
+    def generate_structured(self, prompt: str, schema: Optional[Dict[str, Any]] = None,
+                            temperature: float = 0.0, system_prompt: Optional[str] = None,
+                            model_tier: str = "large") -> Dict[str, Any]:
+        """Generate a JSON object using Gemini's native JSON output mode."""
         generation_config = genai.types.GenerationConfig(
             temperature=temperature,
+            response_mime_type="application/json",
+            response_schema=schema,
         )
-        response = self.model.generate_content(prompt, generation_config=generation_config)
-        return response.text
+        model = self._get_model(system_prompt, model_tier)
+        response = model.generate_content(prompt, generation_config=generation_config)
+        return orjson.loads(response.text)
+    
+    def embed(self, text: str) -> List[float]:
+        """Embed a text using Gemini's embedding model."""
+        result = genai.embed_content(
+            model=self.embedding_model,
+            content=text,
+            task_type="semantic_similarity",
+        )
+        return result["embedding"]
 
 
 # Factory function for easy provider switching
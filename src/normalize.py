@@ -0,0 +1,268 @@
+"""
+Normalization of raw Garmin API responses into flat rows for the database.
+Shared by the backfill and the daily sync.
+"""
+from datetime import date
+from typing import List, Dict, Any, Optional, Tuple
+import pandas as pd
+
+
+# Raw Garmin activity fields read by normalize_activities
+ACTIVITY_FIELDS = [
+    "activityId", "startTimeLocal", "beginTimestamp", "activityType", "activityName",
+    "distance", "duration", "movingDuration", "averageHR", "avgHr", "maxHR", "maxHr",
+    "elevationGain", "averageSpeed", "calories",
+]
+
+
+def _type_key(activity_type: Any) -> Any:
+    # activityType is usually {"typeKey": "running", ...}, occasionally a plain string
+    return activity_type.get("typeKey") if type(activity_type) is dict else activity_type
+
+
+def _numeric(values: pd.Series) -> pd.Series:
+    return pd.to_numeric(values, errors="coerce")
+
+
+def _nonzero(values: pd.Series) -> pd.Series:
+    # Numeric column with missing and 0 values as NaN (Garmin reports 0 for "not measured")
+    values = _numeric(values)
+    return values.where(values != 0)
+
+
+def _parse_timestamps(raw: pd.Series) -> pd.Series:
+    """
+    Parse a column of Garmin timestamps: ISO-style local time strings, or
+    epoch milliseconds (how the ...TimestampLocal fields are sent).
+    """
+    epoch_ms = _numeric(raw)
+    text = raw.where(epoch_ms.isna() & raw.notna())
+    # Garmin sends ISO-style local times, so parse with the fixed ISO8601 parser;
+    # only strings it rejects go through per-element format inference
+    parsed = pd.to_datetime(text, format="ISO8601", errors="coerce")
+    unparsed = parsed.isna() & text.notna()
+    if unparsed.any():
+        parsed[unparsed] = pd.to_datetime(text[unparsed], format="mixed", errors="coerce")
+    return parsed.dt.floor("s").fillna(pd.to_datetime(epoch_ms, unit="ms", errors="coerce"))
+
+
+def _records(normalized: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Turn a normalized DataFrame into row dicts, with NaN as None so missing
+    values are written as NULL.
+    
+    Each column is pulled out as a plain list and the rows are zipped
+    together; to_dict("records") boxes every value in Python.
+    """
+    names = list(normalized.columns)
+    values = [
+        normalized[name].astype(object).where(normalized[name].notna(), None).tolist()
+        for name in names
+    ]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def normalize_activities(activities: List[Dict[str, Any]], since: Optional[date] = None) -> List[Dict[str, Any]]:
+    """
+    Normalize Garmin activities JSON into flat dictionaries.
+    
+    The whole list is loaded into one DataFrame and every field is converted
+    with column operations, instead of building and converting one row at a
+    time. Activities without an ID or a usable start time are skipped.
+    
+    Args:
+        activities: Raw activities from the Garmin API
+        since: Optional first date to keep; older activities are dropped with
+            one vectorized comparison before any row dicts are built
+    """
+    if not activities:
+        return []
+    
+    # Only the fields we use become columns (an activity has 100+ keys); keys
+    # missing from the responses come back as all-NaN columns
+    df = pd.DataFrame(activities, columns=ACTIVITY_FIELDS)
+    
+    # Start time: local time string, or epoch milliseconds from beginTimestamp
+    start_local = df["startTimeLocal"]
+    start_time = _parse_timestamps(start_local.mask(start_local == "").fillna(df["beginTimestamp"]))
+    
+    normalized = pd.DataFrame({
+        "activity_id": df["activityId"].astype("Int64").astype(str),
+        "source": "garmin",
+        "start_time_utc": start_time.astype(object),
+        "date": start_time.dt.date,
+        # As a categorical, each distinct type is one str object shared by all its rows
+        "activity_type": df["activityType"].map(_type_key).astype("category"),
+        "activity_name": df["activityName"],
+        "distance_km": _nonzero(df["distance"]) / 1000,  # meters to km
+        "duration_min": _nonzero(df["duration"]) / 60,  # seconds to minutes
+        "moving_time_min": _nonzero(df["movingDuration"]) / 60,
+        "avg_hr": _nonzero(df["averageHR"]).fillna(_nonzero(df["avgHr"])),
+        "max_hr": _nonzero(df["maxHR"]).fillna(_nonzero(df["maxHr"])),
+        "elevation_gain_m": _numeric(df["elevationGain"]),
+        "avg_speed_kmh": _nonzero(df["averageSpeed"]) * 3.6,  # m/s to km/h
+        "calories": _numeric(df["calories"]),
+    })
+    
+    # Malformed activities are dropped as a group and reported once
+    malformed = start_time.isna() | df["activityId"].isna()
+    if malformed.any():
+        print(f"Warning: Skipping {int(malformed.sum())} activities without an ID or a usable start time")
+        normalized = normalized[~malformed]
+    
+    if since is not None:
+        normalized = normalized[start_time[~malformed] >= pd.Timestamp(since)]
+    
+    return _records(normalized)
+
+
+# Sleep stage -> total-seconds field in dailySleepDTO
+SLEEP_STAGE_TOTALS = {
+    "deep": "deepSleepSeconds",
+    "light": "lightSleepSeconds",
+    "rem": "remSleepSeconds",
+    "awake": "awakeSleepSeconds",
+}
+
+# Raw dailySleepDTO fields read by normalize_sleep_batch
+SLEEP_FIELDS = [
+    "sleepStartTimestampLocal", "sleepEndTimestampLocal", "sleepTimeSeconds", "sleepScores",
+    "averageHeartRate", "lowestHeartRate", "averageRespirationValue",
+] + list(SLEEP_STAGE_TOTALS.values())
+
+
+def _summed_stage_seconds(daily: Dict[str, Any]) -> List[Optional[float]]:
+    """Sum the per-stage interval lists in sleepLevels (the key names the stage).
+    
+    Stages without an interval list stay None so they are stored as NULL.
+    """
+    stage_seconds = dict.fromkeys(SLEEP_STAGE_TOTALS)
+    for key, level_data in daily.get("sleepLevels", {}).items():
+        stage = next((s for s in SLEEP_STAGE_TOTALS if s in key.lower()), None)
+        if stage and isinstance(level_data, list):
+            seconds = sum(entry.get("seconds", 0) for entry in level_data)
+            stage_seconds[stage] = (stage_seconds[stage] or 0) + seconds
+    return list(stage_seconds.values())
+
+
+def _overall_score(scores: Any) -> Any:
+    return scores.get("overall", {}).get("value") if type(scores) is dict else None
+
+
+def normalize_sleep_batch(responses: List[Tuple[Dict[str, Any], date]]) -> List[Dict[str, Any]]:
+    """
+    Normalize many days of Garmin sleep data at once.
+    
+    Args:
+        responses: (sleep data response, date it was fetched for) pairs
+    
+    Returns:
+        One row per day that has a recorded sleep
+    """
+    dailies, days = [], []
+    for sleep_data, query_date in responses:
+        daily = (sleep_data or {}).get("dailySleepDTO")
+        if daily and daily.get("sleepStartTimestampLocal") and daily.get("sleepEndTimestampLocal"):
+            dailies.append(daily)
+            days.append(query_date)
+    if not dailies:
+        return []
+    
+    df = pd.DataFrame(dailies, columns=SLEEP_FIELDS)
+    
+    # Stage totals: dailySleepDTO reports them directly; only the missing ones
+    # fall back to summing the interval lists
+    stages = df[list(SLEEP_STAGE_TOTALS.values())].apply(_numeric)
+    incomplete = stages.isna().any(axis=1)
+    if incomplete.any():
+        summed = pd.DataFrame(
+            [_summed_stage_seconds(daily) for daily, skip in zip(dailies, incomplete) if skip],
+            index=stages.index[incomplete],
+            columns=stages.columns,
+            dtype=float,
+        )
+        stages = stages.fillna(summed)
+    
+    normalized = pd.DataFrame({
+        "date": days,
+        "sleep_start": _parse_timestamps(df["sleepStartTimestampLocal"]).astype(object),
+        "sleep_end": _parse_timestamps(df["sleepEndTimestampLocal"]).astype(object),
+        "sleep_duration_minutes": _numeric(df["sleepTimeSeconds"]).fillna(0) / 60,
+        "deep_sleep_minutes": stages[SLEEP_STAGE_TOTALS["deep"]] / 60,
+        "light_sleep_minutes": stages[SLEEP_STAGE_TOTALS["light"]] / 60,
+        "rem_sleep_minutes": stages[SLEEP_STAGE_TOTALS["rem"]] / 60,
+        "awake_minutes": stages[SLEEP_STAGE_TOTALS["awake"]] / 60,
+        "sleep_score": _numeric(df["sleepScores"].map(_overall_score)),
+        "avg_hr": _numeric(df["averageHeartRate"]),
+        "lowest_hr": _numeric(df["lowestHeartRate"]),
+        "avg_respiration": _numeric(df["averageRespirationValue"]),
+    })
+    return _records(normalized)
+
+
+def normalize_sleep(sleep_data: Dict[str, Any], query_date: date) -> List[Dict[str, Any]]:
+    """
+    Normalize one day of Garmin sleep data into flat dictionaries.
+    """
+    try:
+        return normalize_sleep_batch([(sleep_data, query_date)])
+    except Exception as e:
+        print(f"Warning: Failed to normalize sleep data for {query_date}: {e}")
+        return []
+
+
+# daily_summary column -> raw stats field(s); a 0/missing value falls back to the next field
+DAILY_STATS_FIELDS = {
+    "steps": ["totalSteps", "steps"],
+    "calories": ["activeKilocalories", "calories"],
+    "resting_hr": ["restingHeartRate"],
+    "min_hr": ["minHeartRate"],
+    "max_hr": ["maxHeartRate"],
+    "stress_avg": ["averageStressLevel"],
+    "body_battery_charged": ["bodyBatteryChargedValue"],
+    "body_battery_drained": ["bodyBatteryDrainedValue"],
+    "body_battery_highest": ["bodyBatteryHighestValue"],
+    "body_battery_lowest": ["bodyBatteryLowestValue"],
+    "floors_climbed": ["floorsAscended"],
+}
+DAILY_STATS_INTEGER_COLUMNS = ("steps", "floors_climbed")
+
+
+def normalize_daily_stats_batch(responses: List[Tuple[Dict[str, Any], date]]) -> List[Dict[str, Any]]:
+    """
+    Normalize many days of Garmin daily stats/summary at once.
+    
+    Args:
+        responses: (daily stats response, date it was fetched for) pairs
+    
+    Returns:
+        One row per day with stats
+    """
+    responses = [(stats, query_date) for stats, query_date in responses if stats]
+    if not responses:
+        return []
+    
+    raw_fields = [field for fields in DAILY_STATS_FIELDS.values() for field in fields]
+    df = pd.DataFrame([stats for stats, _ in responses], columns=raw_fields + ["totalDistanceMeters"])
+    
+    normalized = pd.DataFrame({"date": [query_date for _, query_date in responses]})
+    for column, (field, *fallbacks) in DAILY_STATS_FIELDS.items():
+        values = _numeric(df[field])
+        for fallback in fallbacks:
+            values = values.where(values.notna() & (values != 0), _numeric(df[fallback]))
+        if column in DAILY_STATS_INTEGER_COLUMNS:
+            values = values.round().astype("Int64")
+        normalized[column] = values
+    normalized["distance_km"] = _nonzero(df["totalDistanceMeters"]) / 1000
+    return _records(normalized)
+
+
+def normalize_daily_stats(stats: Dict[str, Any], query_date: date) -> List[Dict[str, Any]]:
+    """
+    Normalize one day of Garmin daily stats/summary into flat dictionaries.
+    """
+    try:
+        return normalize_daily_stats_batch([(stats, query_date)])
+    except Exception as e:
+        print(f"Warning: Failed to normalize daily stats for {query_date}: {e}")
+        return []
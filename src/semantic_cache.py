@@ -0,0 +1,194 @@
+"""
+Semantic cache for question -> SQL responses.
+Near-identical questions ("avg running distance last 30 days" vs "average run
+distance over past month") reuse the cached SQL instead of calling the LLM.
+The SQL is always re-executed, so answers reflect fresh data.
+Entries can be persisted to a SQLite file so short-lived CLI runs share them.
+"""
+import re
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Any, List, Optional
+import numpy as np
+import orjson
+
+
+@dataclass
+class CacheEntry:
+    """A cached response for one question."""
+    question: str
+    sql: str
+    embedding: np.ndarray
+    created_at: float
+    extra: Dict[str, Any] = field(default_factory=dict)  # e.g. viz_sql / chart_spec
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?!.")
+
+
+class SemanticCache:
+    """
+    Embedding-based cache keyed on the normalized question.
+    
+    Lookups first try an exact match on the normalized text (no embedding call),
+    then fall back to cosine similarity against all stored embeddings. The
+    number of distinct questions is small, so a brute-force matrix product is
+    faster than maintaining an ANN index.
+    """
+    
+    def __init__(self, embed_fn: Callable[[str], List[float]], threshold: float = 0.92,
+                 ttl: float = 3600, max_entries: int = 1000, path: Optional[Path] = None):
+        """
+        Args:
+            embed_fn: Function returning an embedding vector for a text
+            threshold: Minimum cosine similarity for a hit
+            ttl: Seconds before an entry expires
+            max_entries: Oldest entries are evicted beyond this size
+            path: Optional SQLite file to persist entries across processes
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = Path(path) if path else None
+        self._entries: Dict[str, CacheEntry] = {}
+        self._matrix: Optional[np.ndarray] = None  # stacked, normalized embeddings
+        self._keys: List[str] = []
+        self._lock = threading.Lock()
+        if self.path:
+            self._load()
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                key TEXT PRIMARY KEY,
+                question TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                extra TEXT
+            )
+        """)
+        return conn
+    
+    def _load(self):
+        """Load unexpired entries from the SQLite file (oldest first, for eviction order)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM semantic_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            rows = conn.execute(
+                "SELECT key, question, sql, embedding, created_at, extra "
+                "FROM semantic_cache ORDER BY created_at"
+            ).fetchall()
+        finally:
+            conn.close()
+        for key, question, sql, embedding, created_at, extra in rows[-self.max_entries:]:
+            self._entries[key] = CacheEntry(
+                question, sql, np.frombuffer(embedding, dtype=np.float32),
+                created_at, orjson.loads(extra) if extra else {}
+            )
+        self._rebuild()
+    
+    def _persist(self, key: str, entry: CacheEntry):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO semantic_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, entry.question, entry.sql, entry.embedding.tobytes(),
+                     entry.created_at, orjson.dumps(entry.extra, default=str, option=orjson.OPT_SERIALIZE_NUMPY).decode()),
+                )
+        finally:
+            conn.close()
+    
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embed_fn(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.created_at < self.ttl
+    
+    def _rebuild(self):
+        """Rebuild the embedding matrix after entries change (call with lock held)."""
+        self._keys = list(self._entries)
+        if self._keys:
+            self._matrix = np.stack([self._entries[k].embedding for k in self._keys])
+        else:
+            self._matrix = None
+    
+    def lookup(self, question: str) -> Optional[CacheEntry]:
+        """
+        Find a cached entry for a question.
+        
+        Args:
+            question: The user's question
+        
+        Returns:
+            The matching CacheEntry, or None on a miss
+        """
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_fresh(entry):
+                    return entry
+                del self._entries[key]
+                self._rebuild()
+            if self._matrix is None:
+                return None
+        
+        embedding = self._embed(key)
+        with self._lock:
+            if self._matrix is None:
+                return None
+            scores = self._matrix @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            entry = self._entries.get(self._keys[best])
+            if entry is None or not self._is_fresh(entry):
+                return None
+            return entry
+    
+    def store(self, question: str, sql: str, **extra) -> None:
+        """
+        Cache the SQL (and optional extras) generated for a question.
+        
+        Args:
+            question: The user's question
+            sql: The SQL generated for it
+            **extra: Additional values to cache alongside the SQL
+        """
+        key = normalize_question(question)
+        embedding = self._embed(key)
+        entry = CacheEntry(question, sql, embedding, time.time(), dict(extra))
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._rebuild()
+        if self.path:
+            self._persist(key, entry)
+    
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        with self._lock:
+            self._entries.clear()
+            self._rebuild()
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM semantic_cache")
+            finally:
+                conn.close()
@@ -0,0 +1,100 @@
+"""
+Curated question -> SQL examples for the SQL generation prompt.
+They cover the patterns the model most often gets wrong (date ranges,
+NULL-heavy metrics, joining sleep with daily_summary, weekly buckets).
+The examples are part of the static system prompt, so they are served
+from the provider's prefix cache rather than re-billed on every call.
+"""
+from typing import List, Tuple
+
+
+SQL_EXAMPLES: List[Tuple[str, str]] = [
+    (
+        "What is my average running distance in the last 30 days?",
+        """SELECT ROUND(AVG(distance_km)::numeric, 2) AS avg_distance_km, COUNT(*) AS runs
+FROM activities
+WHERE activity_type = 'running' AND date >= CURRENT_DATE - INTERVAL '30 days'""",
+    ),
+    (
+        "Show me my top 5 longest runs this year",
+        """SELECT date, activity_name, distance_km, duration_min
+FROM activities
+WHERE activity_type = 'running' AND date >= DATE_TRUNC('year', CURRENT_DATE)
+ORDER BY distance_km DESC NULLS LAST
+LIMIT 5""",
+    ),
+    (
+        "How many kilometers did I run per week over the last 3 months?",
+        """SELECT DATE_TRUNC('week', date)::date AS week, ROUND(SUM(distance_km)::numeric, 1) AS total_km
+FROM activities
+WHERE activity_type = 'running' AND date >= CURRENT_DATE - INTERVAL '3 months'
+GROUP BY 1
+ORDER BY 1""",
+    ),
+    (
+        "How has my sleep score changed month by month in 2024?",
+        """SELECT DATE_TRUNC('month', date)::date AS month, ROUND(AVG(sleep_score)::numeric, 1) AS avg_sleep_score
+FROM sleep
+WHERE date >= '2024-01-01' AND date < '2025-01-01'
+GROUP BY 1
+ORDER BY 1""",
+    ),
+    (
+        "Does my resting heart rate go up after nights with little deep sleep?",
+        """SELECT s.date, s.deep_sleep_minutes, d.resting_hr
+FROM sleep s
+JOIN daily_summary d ON d.date = s.date
+WHERE s.date >= CURRENT_DATE - INTERVAL '90 days'
+  AND s.deep_sleep_minutes IS NOT NULL AND d.resting_hr IS NOT NULL
+ORDER BY s.date""",
+    ),
+    (
+        "Do I run faster when I sleep better?",
+        """SELECT a.date, a.avg_speed_kmh, s.sleep_score
+FROM activities a
+JOIN sleep s ON s.date = a.date
+WHERE a.activity_type = 'running' AND a.avg_speed_kmh IS NOT NULL AND s.sleep_score IS NOT NULL
+ORDER BY a.date""",
+    ),
+    (
+        "Compare my steps on workout days vs rest days",
+        """SELECT CASE WHEN EXISTS (SELECT 1 FROM activities a WHERE a.date = d.date)
+            THEN 'workout day' ELSE 'rest day' END AS day_type,
+       ROUND(AVG(d.steps)::numeric, 0) AS avg_steps,
+       COUNT(*) AS days
+FROM daily_summary d
+WHERE d.date >= CURRENT_DATE - INTERVAL '6 months'
+GROUP BY 1""",
+    ),
+    (
+        "What's my average sleep duration by day of week?",
+        """SELECT TO_CHAR(date, 'Dy') AS weekday, EXTRACT(ISODOW FROM date) AS weekday_num,
+       ROUND(AVG(sleep_duration_minutes)::numeric / 60, 2) AS avg_sleep_hours
+FROM sleep
+WHERE date >= CURRENT_DATE - INTERVAL '1 year'
+GROUP BY 1, 2
+ORDER BY 2""",
+    ),
+    (
+        "Which activity types do I do most often?",
+        """SELECT activity_type, COUNT(*) AS activities, ROUND(SUM(duration_min)::numeric / 60, 1) AS total_hours
+FROM activities
+GROUP BY activity_type
+ORDER BY activities DESC""",
+    ),
+    (
+        "Show me days where my body battery was above 80",
+        """SELECT date, body_battery_highest, body_battery_lowest, stress_avg
+FROM daily_summary
+WHERE body_battery_highest > 80
+ORDER BY date DESC""",
+    ),
+]
+
+
+def format_sql_examples() -> str:
+    """Format the examples as a prompt section."""
+    parts = ["Examples:"]
+    for question, sql in SQL_EXAMPLES:
+        parts.append(f'Question: "{question}"\nSQL:\n{sql}\n')
+    return "\n".join(parts)
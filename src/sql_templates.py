@@ -0,0 +1,178 @@
+"""
+Rule-based SQL for the most common, predictable questions.
+A question that fully matches one of these templates gets its SQL without an
+LLM round trip; anything else (including any extra qualifier) falls through
+to the LLM.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# Natural-language metric -> (table, column, extra filter)
+METRICS: Dict[str, Tuple[str, str, Optional[str]]] = {
+    "running distance": ("activities", "distance_km", "activity_type = 'running'"),
+    "run distance": ("activities", "distance_km", "activity_type = 'running'"),
+    "running speed": ("activities", "avg_speed_kmh", "activity_type = 'running'"),
+    "running heart rate": ("activities", "avg_hr", "activity_type = 'running'"),
+    "cycling distance": ("activities", "distance_km", "activity_type = 'cycling'"),
+    "cycling speed": ("activities", "avg_speed_kmh", "activity_type = 'cycling'"),
+    "workout duration": ("activities", "duration_min", None),
+    "activity duration": ("activities", "duration_min", None),
+    "sleep score": ("sleep", "sleep_score", None),
+    "sleep duration": ("sleep", "sleep_duration_minutes", None),
+    "deep sleep": ("sleep", "deep_sleep_minutes", None),
+    "rem sleep": ("sleep", "rem_sleep_minutes", None),
+    "steps": ("daily_summary", "steps", None),
+    "daily steps": ("daily_summary", "steps", None),
+    "step count": ("daily_summary", "steps", None),
+    "resting heart rate": ("daily_summary", "resting_hr", None),
+    "resting hr": ("daily_summary", "resting_hr", None),
+    "stress": ("daily_summary", "stress_avg", None),
+    "stress level": ("daily_summary", "stress_avg", None),
+    "floors climbed": ("daily_summary", "floors_climbed", None),
+}
+
+# Plural activity noun -> activity_type
+ACTIVITY_NOUNS: Dict[str, str] = {
+    "runs": "running",
+    "rides": "cycling",
+    "bike rides": "cycling",
+    "swims": "swimming",
+    "walks": "walking",
+    "hikes": "hiking",
+}
+
+# Free-form activity words -> stored activity_type (Garmin typeKey). Used to hint
+# the LLM so "my jogs" or "bike rides" don't turn into zero-row filters.
+ACTIVITY_SYNONYMS: Dict[str, str] = {
+    "run": "running",
+    "runs": "running",
+    "running": "running",
+    "jog": "running",
+    "jogs": "running",
+    "jogging": "running",
+    "bike": "cycling",
+    "biking": "cycling",
+    "ride": "cycling",
+    "rides": "cycling",
+    "cycle": "cycling",
+    "cycling": "cycling",
+    "swim": "swimming",
+    "swims": "swimming",
+    "swimming": "swimming",
+    "walk": "walking",
+    "walks": "walking",
+    "walking": "walking",
+    "hike": "hiking",
+    "hikes": "hiking",
+    "hiking": "hiking",
+    "lifting": "strength_training",
+    "weights": "strength_training",
+    "gym": "strength_training",
+    "strength": "strength_training",
+    "yoga": "yoga",
+}
+
+AGGREGATES = {"average": "AVG", "avg": "AVG", "mean": "AVG", "total": "SUM"}
+
+_METRIC_ALT = "|".join(re.escape(m) for m in sorted(METRICS, key=len, reverse=True))
+_NOUN_ALT = "|".join(re.escape(n) for n in sorted(ACTIVITY_NOUNS, key=len, reverse=True))
+
+# "what is my average running distance over the last 30 days"
+_AGG_LAST_N = re.compile(
+    rf"(?:what(?:'s| is| was) )?(?:my )?(?P<agg>average|avg|mean|total) (?P<metric>{_METRIC_ALT})"
+    rf" (?:in|over|for|during) (?:the )?(?:last|past) (?P<n>\d+) (?P<unit>days?|weeks?|months?)"
+)
+# "what is my total steps this month"
+_AGG_THIS_PERIOD = re.compile(
+    rf"(?:what(?:'s| is| was) )?(?:my )?(?P<agg>average|avg|mean|total) (?P<metric>{_METRIC_ALT})"
+    rf" (?P<period>this week|this month|this year)"
+)
+# "show me my top 5 longest runs this year"
+_TOP_LONGEST = re.compile(
+    rf"(?:show me |list |what are )?(?:my )?top (?P<k>\d+) longest (?P<noun>{_NOUN_ALT})"
+    rf"(?: (?P<period>this week|this month|this year|ever))?"
+)
+
+_ACTIVITY_WORD = re.compile(
+    r"\b(" + "|".join(sorted(ACTIVITY_SYNONYMS, key=len, reverse=True)) + r")\b", re.IGNORECASE
+)
+
+_PERIOD_TRUNC = {"this week": "week", "this month": "month", "this year": "year"}
+
+
+def _normalize(question: str) -> str:
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?!.")
+
+
+def _aggregate_sql(agg_word: str, metric: str, date_filter: str) -> str:
+    """Build an aggregate-over-a-period query for a metric."""
+    table, column, extra = METRICS[metric]
+    agg = AGGREGATES[agg_word]
+    count_name = "activities" if table == "activities" else "days"
+    where = f"WHERE {date_filter}" + (f" AND {extra}" if extra else "")
+    return (
+        f"SELECT ROUND({agg}({column})::numeric, 2) AS {agg.lower()}_{column}, COUNT(*) AS {count_name}\n"
+        f"FROM {table}\n{where}"
+    )
+
+
+def match_template(question: str) -> Optional[str]:
+    """
+    Return template SQL if the whole question matches a known pattern.
+    
+    Args:
+        question: The user's natural language question
+    
+    Returns:
+        SQL query string, or None if the question should go to the LLM
+    """
+    text = _normalize(question)
+    
+    match = _AGG_LAST_N.fullmatch(text)
+    if match:
+        unit = match["unit"].rstrip("s")
+        date_filter = f"date >= CURRENT_DATE - INTERVAL '{int(match['n'])} {unit}s'"
+        return _aggregate_sql(match["agg"], match["metric"], date_filter)
+    
+    match = _AGG_THIS_PERIOD.fullmatch(text)
+    if match:
+        date_filter = f"date >= DATE_TRUNC('{_PERIOD_TRUNC[match['period']]}', CURRENT_DATE)"
+        return _aggregate_sql(match["agg"], match["metric"], date_filter)
+    
+    match = _TOP_LONGEST.fullmatch(text)
+    if match:
+        activity_type = ACTIVITY_NOUNS[match["noun"]]
+        period = match["period"]
+        conditions = [f"activity_type = '{activity_type}'"]
+        if period and period != "ever":
+            conditions.append(f"date >= DATE_TRUNC('{_PERIOD_TRUNC[period]}', CURRENT_DATE)")
+        return (
+            "SELECT date, activity_name, distance_km, duration_min, avg_speed_kmh\n"
+            "FROM activities\n"
+            f"WHERE {' AND '.join(conditions)}\n"
+            "ORDER BY distance_km DESC NULLS LAST\n"
+            f"LIMIT {int(match['k'])}"
+        )
+    
+    return None
+
+
+def activity_type_hints(question: str) -> List[str]:
+    """
+    Resolve activity words in a question to their stored activity_type values.
+    
+    Args:
+        question: The user's natural language question
+    
+    Returns:
+        Prompt hint lines, one per distinct activity_type mentioned
+    """
+    hints: Dict[str, str] = {}
+    for word in _ACTIVITY_WORD.findall(question):
+        activity_type = ACTIVITY_SYNONYMS[word.lower()]
+        hints.setdefault(activity_type, word)
+    return [
+        f"Hint: \"{word}\" likely means activity_type = '{activity_type}'"
+        for activity_type, word in hints.items()
+    ]
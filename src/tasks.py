@@ -6,7 +6,7 @@ import sys
 from datetime import date
 from typing import Optional
 
-from .database import init_schema, check_connection
+from .database import init_schema, check_connection, compact_tables, close_pools, async_commit
 from .daily_sync import sync_activities, sync_sleep, sync_daily_summary
 
 
@@ -55,7 +55,8 @@ def run_daily_sync(
     print("GARMIN DAILY SYNC (Airflow Task)")
     print("=" * 80)
     print(f"Entities: {', '.join(entities)}")
-    print(f"Date: {date.today()}")
+    today = date.today()
+    print(f"Date: {today}")
     
     # Check database connection
     print("\nChecking database connection...")
@@ -70,19 +71,24 @@ def run_daily_sync(
     init_schema()
     
     try:
+        from .garmin_client import get_client
+        
+        # One authenticated client shared by all entity syncs
+        gc = get_client()
+        
         # Sync activities
         if "activities" in entities:
-            result["activities"] = sync_activities(lookback_days=activity_lookback_days)
+            result["activities"] = sync_activities(lookback_days=activity_lookback_days, today=today, gc=gc)
             result["total_new_records"] += result["activities"]
         
         # Sync sleep
         if "sleep" in entities:
-            result["sleep"] = sync_sleep()
+            result["sleep"] = sync_sleep(today=today, gc=gc)
             result["total_new_records"] += result["sleep"]
         
         # Sync daily summary
         if "daily_summary" in entities:
-            result["daily_summary"] = sync_daily_summary()
+            result["daily_summary"] = sync_daily_summary(today=today, gc=gc)
             result["total_new_records"] += result["daily_summary"]
         
         result["success"] = True
@@ -97,6 +103,8 @@ def run_daily_sync(
         print(f"\n✗ {error_msg}")
         traceback.print_exc()
         result["error"] = error_msg
+    finally:
+        close_pools()
     
     return result
 
@@ -121,6 +129,7 @@ def run_full_backfill(
         Dictionary with backfill results
     """
     from datetime import timedelta
+    from .garmin_client import get_client
     from .backfill import (
         backfill_activities,
         backfill_sleep,
@@ -156,14 +165,18 @@ def run_full_backfill(
     init_schema()
     
     try:
-        if "activities" in entities:
-            backfill_activities()
+        gc = get_client()
         
-        if "sleep" in entities:
-            backfill_sleep(start_dt, end_dt)
-        
-        if "daily_summary" in entities:
-            backfill_daily_summary(start_dt, end_dt)
+        # Bulk load: don't wait for a WAL flush on every batch commit
+        with async_commit():
+            if "activities" in entities:
+                backfill_activities(gc)
+            
+            if "sleep" in entities:
+                backfill_sleep(start_dt, end_dt, gc)
+            
+            if "daily_summary" in entities:
+                backfill_daily_summary(start_dt, end_dt, gc)
         
         result["success"] = True
         print("\n✓ Backfill complete!")
@@ -172,6 +185,45 @@ def run_full_backfill(
         import traceback
         result["error"] = str(e)
         traceback.print_exc()
+    finally:
+        close_pools()
     
     return result
 
+
+def run_maintenance(tables: Optional[list] = None) -> dict:
+    """
+    Run weekly database maintenance (compaction + statistics refresh).
+    
+    Args:
+        tables: Tables to compact. Defaults to all.
+    
+    Returns:
+        Dictionary with maintenance results
+    """
+    result = {
+        "success": False,
+        "error": None
+    }
+    
+    print("=" * 80)
+    print("GARMIN DB MAINTENANCE (Airflow Task)")
+    print("=" * 80)
+    
+    if not check_connection():
+        result["error"] = "Cannot connect to PostgreSQL database"
+        return result
+    
+    try:
+        compact_tables(tables)
+        result["success"] = True
+        print("\n✓ Maintenance complete!")
+    
+    except Exception as e:
+        import traceback
+        result["error"] = str(e)
+        traceback.print_exc()
+    finally:
+        close_pools()
+    
+    return result
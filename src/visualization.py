@@ -2,10 +2,11 @@
 Visualization module for generating Garmin-themed charts.
 Uses Plotly with Garmin brand colors.
 """
+from itertools import cycle
 import plotly.graph_objects as go
-import plotly.express as px
+import numpy as np
 import pandas as pd
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 
 # Garmin brand colors
@@ -18,45 +19,82 @@ GARMIN_LIGHT_GRAY = "#F5F5F5"
 # Color sequence for multi-series charts
 GARMIN_COLORS = [GARMIN_BLUE, GARMIN_TEAL, GARMIN_ORANGE, "#4CAF50", "#9C27B0", "#FF9800"]
 
+# Table chart styling (zebra stripes cover the 50-row display limit)
+TABLE_MAX_ROWS = 50
+TABLE_HEADER_STYLE = {"fill_color": GARMIN_BLUE, "font": {"color": "white", "size": 12}, "align": "left"}
+TABLE_CELL_STYLE = {"align": "left", "font": {"size": 11}}
+TABLE_ROW_COLORS = [GARMIN_LIGHT_GRAY, "white"] * (TABLE_MAX_ROWS // 2)
+
+# Line traces longer than this are downsampled (LTTB) to about one point per pixel
+LINE_MAX_POINTS = 2000
+# Traces with more points than this are drawn with WebGL (Scattergl) instead of SVG
+WEBGL_MIN_POINTS = 1000
+
+
+# Shared Garmin layout; charts only unpack it into update_layout, so it is built once
+_BASE_LAYOUT: Dict[str, Any] = {
+    "plot_bgcolor": "white",
+    "paper_bgcolor": "white",
+    "font": {
+        "family": "Inter, -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif",
+        "color": GARMIN_DARK,
+        "size": 12
+    },
+    "xaxis": {
+        "gridcolor": "#E0E0E0",
+        "showgrid": True,
+        "zeroline": False
+    },
+    "yaxis": {
+        "gridcolor": "#E0E0E0",
+        "showgrid": True,
+        "zeroline": False
+    },
+    "margin": {"l": 60, "r": 40, "t": 60, "b": 60},
+    "hovermode": "closest"
+}
+_TITLE_FONT = {"size": 18, "color": GARMIN_DARK}
+
 
 def get_garmin_layout(title: str = None) -> Dict[str, Any]:
     """
     Get base Plotly layout with Garmin styling.
     
+    The returned dict shares its nested values with the module-level base
+    layout; unpack it into fig.update_layout rather than mutating it.
+    
     Args:
         title: Optional chart title
     """
-    layout = {
-        "plot_bgcolor": "white",
-        "paper_bgcolor": "white",
-        "font": {
-            "family": "Inter, -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif",
-            "color": GARMIN_DARK,
-            "size": 12
-        },
-        "xaxis": {
-            "gridcolor": "#E0E0E0",
-            "showgrid": True,
-            "zeroline": False
-        },
-        "yaxis": {
-            "gridcolor": "#E0E0E0",
-            "showgrid": True,
-            "zeroline": False
-        },
-        "margin": {"l": 60, "r": 40, "t": 60, "b": 60},
-        "hovermode": "closest"
+    if not title:
+        return _BASE_LAYOUT
+    return {
+        **_BASE_LAYOUT,
+        "title": {"text": title, "font": _TITLE_FONT, "x": 0.5, "xanchor": "center"}
     }
+
+
+def chart_column_groups(df: pd.DataFrame) -> Dict[str, List[str]]:
+    """
+    Group a DataFrame's columns once for the chart auto-detection.
     
-    if title:
-        layout["title"] = {
-            "text": title,
-            "font": {"size": 18, "color": GARMIN_DARK},
-            "x": 0.5,
-            "xanchor": "center"
-        }
+    Not ai_explorer.classify_columns: bool columns count as non-numeric here,
+    matching select_dtypes(include="number").
     
-    return layout
+    Returns:
+        Dict with "numeric", "non_numeric" and "date_like" column name lists
+    """
+    # Same split as select_dtypes(include="number"), which leaves out bools
+    is_numeric = df.dtypes.map(
+        lambda dtype: pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+    )
+    columns = df.columns
+    lowered = [str(col).lower() for col in columns]
+    return {
+        "numeric": columns[is_numeric.to_numpy(dtype=bool)].tolist(),
+        "non_numeric": columns[~is_numeric.to_numpy(dtype=bool)].tolist(),
+        "date_like": [col for col, low in zip(columns, lowered) if 'date' in low or 'time' in low],
+    }
 
 
 def render_chart(df: pd.DataFrame, chart_spec: Dict[str, Any]) -> go.Figure:
@@ -81,26 +119,97 @@ def render_chart(df: pd.DataFrame, chart_spec: Dict[str, Any]) -> go.Figure:
     chart_type = chart_spec.get("chart_type", "bar").lower()
     title = chart_spec.get("title", "Data Visualization")
     
+    # A single row can't draw a line; show it as a bar instead
+    if chart_type == "line" and len(df) == 1:
+        chart_type = "bar"
+    
     try:
-        if chart_type == "line":
-            return create_line_chart(df, chart_spec)
-        elif chart_type == "bar":
-            return create_bar_chart(df, chart_spec)
-        elif chart_type == "scatter":
-            return create_scatter_chart(df, chart_spec)
-        elif chart_type == "pie":
-            return create_pie_chart(df, chart_spec)
-        elif chart_type == "table":
+        if chart_type == "table":
             return create_table_chart(df, chart_spec)
-        else:
-            # Default to bar chart
-            return create_bar_chart(df, chart_spec)
+        # Unknown chart types default to a bar chart
+        create_chart = CHART_BUILDERS.get(chart_type, create_bar_chart)
+        return create_chart(df, chart_spec, chart_column_groups(df))
     except Exception as e:
         return create_empty_chart(f"Error creating chart: {str(e)}")
 
 
-def create_line_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
-    """Create a line chart."""
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Pick threshold point indices with Largest-Triangle-Three-Buckets downsampling.
+    
+    The first and last points are kept; the points in between are split into
+    threshold - 2 buckets and from each bucket the point forming the largest
+    triangle with the previously kept point and the next bucket's average is
+    kept, which preserves peaks and the overall shape of the line.
+    
+    Args:
+        x: Numeric x values, sorted ascending
+        y: Numeric y values (no NaN)
+        threshold: Number of points to keep
+    
+    Returns:
+        Sorted indices of the kept points
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    # Bucket averages don't depend on the selection, so compute them all up front;
+    # the last bucket looks ahead to the final point instead
+    counts = np.diff(edges)
+    avg_xs = np.append(np.add.reduceat(x[:-1], edges[:-1])[1:] / counts[1:], x[n - 1])
+    avg_ys = np.append(np.add.reduceat(y[:-1], edges[:-1])[1:] / counts[1:], y[n - 1])
+    
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        avg_x, avg_y = avg_xs[i], avg_ys[i]
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def _line_points(df: pd.DataFrame, x_col: str, y_col: str) -> Tuple[pd.Series, pd.Series]:
+    """
+    x/y values for one line trace, downsampled with LTTB to LINE_MAX_POINTS
+    when the series is longer and x is numeric or a date.
+    """
+    x, y = df[x_col], df[y_col]
+    if len(df) <= LINE_MAX_POINTS:
+        return x, y
+    
+    points = df[[x_col, y_col]].dropna()
+    x, y = points[x_col], points[y_col]
+    if not pd.api.types.is_numeric_dtype(y):
+        return df[x_col], df[y_col]
+    if x.dtype == object:
+        # PostgreSQL DATE columns arrive as datetime.date objects
+        parsed = pd.to_datetime(x, errors="coerce")
+        if not parsed.isna().any():
+            x = parsed
+    if pd.api.types.is_datetime64_any_dtype(x):
+        x_numeric = x.to_numpy(dtype="datetime64[ns]").astype("int64").astype(float)
+    elif pd.api.types.is_numeric_dtype(x):
+        x_numeric = x.to_numpy(dtype=float)
+    else:
+        return df[x_col], df[y_col]
+    if not x.is_monotonic_increasing:
+        return df[x_col], df[y_col]
+    
+    kept = lttb_indices(x_numeric, y.to_numpy(dtype=float), LINE_MAX_POINTS)
+    return x.iloc[kept], y.iloc[kept]
+
+
+def create_line_chart(df: pd.DataFrame, spec: Dict[str, Any],
+                      columns: Optional[Dict[str, List[str]]] = None) -> go.Figure:
+    """Create a line chart (columns: chart_column_groups(df), computed if not given)."""
+    columns = columns or chart_column_groups(df)
     x_col = spec.get("x_axis")
     y_col = spec.get("y_axis")
     color_by = spec.get("color_by")
@@ -109,37 +218,47 @@ def create_line_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
     # Auto-detect if not specified
     if not x_col:
         # Use first column that looks like a date or the first column
-        date_cols = [col for col in df.columns if 'date' in col.lower() or 'time' in col.lower()]
+        date_cols = columns["date_like"]
         x_col = date_cols[0] if date_cols else df.columns[0]
     
     if not y_col:
         # Use first numeric column that's not the x_col
-        numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+        numeric_cols = columns["numeric"]
         y_col = [col for col in numeric_cols if col != x_col][0] if numeric_cols else df.columns[1]
     
+    # Long series: WebGL rendering and no per-point markers
+    large = len(df) > WEBGL_MIN_POINTS
+    trace_type = go.Scattergl if large else go.Scatter
+    mode = 'lines' if large else 'lines+markers'
+    
     if isinstance(y_col, list):
         # Multiple y columns
         fig = go.Figure()
-        for i, col in enumerate(y_col):
-            fig.add_trace(go.Scatter(
-                x=df[x_col],
-                y=df[col],
-                mode='lines+markers',
+        marker = dict(size=6)
+        for col, color in zip(y_col, cycle(GARMIN_COLORS)):
+            x_values, y_values = _line_points(df, x_col, col)
+            fig.add_trace(trace_type(
+                x=x_values,
+                y=y_values,
+                mode=mode,
                 name=col,
-                line=dict(color=GARMIN_COLORS[i % len(GARMIN_COLORS)], width=2),
-                marker=dict(size=6)
+                line=dict(color=color, width=2),
+                marker=marker
             ))
     else:
         if color_by and color_by in df.columns:
             # Color by category
+            import plotly.express as px  # slow to import; only needed for grouped lines
             fig = px.line(df, x=x_col, y=y_col, color=color_by, 
-                         title=title, color_discrete_sequence=GARMIN_COLORS)
+                         title=title, color_discrete_sequence=GARMIN_COLORS,
+                         render_mode='webgl' if large else 'auto')
         else:
+            x_values, y_values = _line_points(df, x_col, y_col)
             fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=df[x_col],
-                y=df[y_col],
-                mode='lines+markers',
+            fig.add_trace(trace_type(
+                x=x_values,
+                y=y_values,
+                mode=mode,
                 line=dict(color=GARMIN_BLUE, width=2),
                 marker=dict(size=6),
                 name=y_col
@@ -149,8 +268,10 @@ def create_line_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
     return fig
 
 
-def create_bar_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
-    """Create a bar chart."""
+def create_bar_chart(df: pd.DataFrame, spec: Dict[str, Any],
+                     columns: Optional[Dict[str, List[str]]] = None) -> go.Figure:
+    """Create a bar chart (columns: chart_column_groups(df), computed if not given)."""
+    columns = columns or chart_column_groups(df)
     x_col = spec.get("x_axis")
     y_col = spec.get("y_axis")
     color_by = spec.get("color_by")
@@ -160,10 +281,11 @@ def create_bar_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
     if not x_col:
         x_col = df.columns[0]
     if not y_col:
-        numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+        numeric_cols = columns["numeric"]
         y_col = numeric_cols[0] if numeric_cols else df.columns[1]
     
     if color_by and color_by in df.columns:
+        import plotly.express as px  # slow to import; only needed for grouped bars
         fig = px.bar(df, x=x_col, y=y_col, color=color_by,
                     title=title, color_discrete_sequence=GARMIN_COLORS)
     else:
@@ -179,8 +301,10 @@ def create_bar_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
     return fig
 
 
-def create_scatter_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
-    """Create a scatter plot."""
+def create_scatter_chart(df: pd.DataFrame, spec: Dict[str, Any],
+                         columns: Optional[Dict[str, List[str]]] = None) -> go.Figure:
+    """Create a scatter plot (columns: chart_column_groups(df), computed if not given)."""
+    columns = columns or chart_column_groups(df)
     x_col = spec.get("x_axis")
     y_col = spec.get("y_axis")
     color_by = spec.get("color_by")
@@ -188,7 +312,7 @@ def create_scatter_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
     
     # Auto-detect numeric columns
     if not x_col or not y_col:
-        numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+        numeric_cols = columns["numeric"]
         if len(numeric_cols) >= 2:
             x_col = x_col or numeric_cols[0]
             y_col = y_col or numeric_cols[1]
@@ -196,12 +320,18 @@ def create_scatter_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
             x_col = x_col or df.columns[0]
             y_col = y_col or df.columns[1]
     
+    # WebGL only pays off once its GPU setup cost is amortized over many points
+    large = len(df) > WEBGL_MIN_POINTS
+    
     if color_by and color_by in df.columns:
+        import plotly.express as px  # slow to import; only needed for grouped points
         fig = px.scatter(df, x=x_col, y=y_col, color=color_by,
-                        title=title, color_discrete_sequence=GARMIN_COLORS)
+                        title=title, color_discrete_sequence=GARMIN_COLORS,
+                        render_mode='webgl' if large else 'auto')
     else:
+        trace_type = go.Scattergl if large else go.Scatter
         fig = go.Figure()
-        fig.add_trace(go.Scatter(
+        fig.add_trace(trace_type(
             x=df[x_col],
             y=df[y_col],
             mode='markers',
@@ -213,8 +343,10 @@ def create_scatter_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
     return fig
 
 
-def create_pie_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
-    """Create a pie chart."""
+def create_pie_chart(df: pd.DataFrame, spec: Dict[str, Any],
+                     columns: Optional[Dict[str, List[str]]] = None) -> go.Figure:
+    """Create a pie chart (columns: chart_column_groups(df), computed if not given)."""
+    columns = columns or chart_column_groups(df)
     labels_col = spec.get("x_axis") or spec.get("labels")
     values_col = spec.get("y_axis") or spec.get("values")
     title = spec.get("title", "Pie Chart")
@@ -222,12 +354,12 @@ def create_pie_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
     # Auto-detect
     if not labels_col:
         # Use first non-numeric column
-        non_numeric = df.select_dtypes(exclude=['number']).columns.tolist()
+        non_numeric = columns["non_numeric"]
         labels_col = non_numeric[0] if non_numeric else df.columns[0]
     
     if not values_col:
         # Use first numeric column
-        numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+        numeric_cols = columns["numeric"]
         values_col = numeric_cols[0] if numeric_cols else df.columns[1]
     
     fig = go.Figure()
@@ -246,22 +378,19 @@ def create_table_chart(df: pd.DataFrame, spec: Dict[str, Any]) -> go.Figure:
     """Create a table visualization."""
     title = spec.get("title", "Data Table")
     
-    # Limit to first 50 rows for display
-    display_df = df.head(50)
+    # Limit to first rows for display
+    display_df = df.head(TABLE_MAX_ROWS)
     
     fig = go.Figure(data=[go.Table(
         header=dict(
             values=[f"<b>{col}</b>" for col in display_df.columns],
-            fill_color=GARMIN_BLUE,
-            font=dict(color='white', size=12),
-            align='left'
+            **TABLE_HEADER_STYLE
         ),
         cells=dict(
-            values=[display_df[col] for col in display_df.columns],
-            fill_color=[[GARMIN_LIGHT_GRAY if i % 2 == 0 else 'white' 
-                        for i in range(len(display_df))]],
-            align='left',
-            font=dict(size=11)
+            # numpy arrays serialize faster than Series
+            values=[display_df[col].to_numpy() for col in display_df.columns],
+            fill_color=[TABLE_ROW_COLORS[:len(display_df)]],
+            **TABLE_CELL_STYLE
         )
     )])
     
@@ -287,3 +416,12 @@ def create_empty_chart(message: str = "No data available") -> go.Figure:
     )
     fig.update_layout(**get_garmin_layout(), height=400)
     return fig
+
+
+# chart_type -> builder taking (df, spec, columns); "table" is handled separately
+CHART_BUILDERS = {
+    "line": create_line_chart,
+    "bar": create_bar_chart,
+    "scatter": create_scatter_chart,
+    "pie": create_pie_chart,
+}
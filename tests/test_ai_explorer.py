@@ -0,0 +1,62 @@
+"""
+Tests for the chart helpers in src/ai_explorer.py (no database or LLM needed).
+"""
+import pandas as pd
+
+from src.ai_explorer import VIZ_LINE_MAX_POINTS, aggregate_line_sql
+
+
+VIZ_SQL = "SELECT date, steps FROM daily_summary"
+
+
+def _daily_steps(days: int) -> pd.DataFrame:
+    dates = pd.date_range("2018-01-01", periods=days, freq="D")
+    return pd.DataFrame({"date": dates.date, "steps": range(days)})
+
+
+def test_aggregate_line_sql_buckets_long_date_series():
+    df = _daily_steps(VIZ_LINE_MAX_POINTS + 500)
+    spec = {"chart_type": "line", "x_axis": "date", "y_axis": "steps"}
+    
+    sql = aggregate_line_sql(VIZ_SQL, spec, df)
+    
+    assert sql is not None
+    # The bucket is picked from the full date span in SQL, not from df
+    assert "MAX(\"date\")::date - MIN(\"date\")::date + 1 <= 2000 THEN 'day'" in sql
+    assert "DATE_TRUNC((SELECT unit FROM bucket), \"date\")::date AS \"date\"" in sql
+    assert "AVG(\"steps\")::float8 AS \"steps\"" in sql
+    assert f"WITH viz AS (\n{VIZ_SQL}\n)" in sql
+
+
+def test_aggregate_line_sql_survives_trailing_comment():
+    df = _daily_steps(VIZ_LINE_MAX_POINTS + 1)
+    spec = {"chart_type": "line", "x_axis": "date", "y_axis": "steps"}
+    
+    sql = aggregate_line_sql(VIZ_SQL + "; -- daily steps", spec, df)
+    
+    assert f"WITH viz AS (\n{VIZ_SQL}\n)," in sql
+
+
+def test_aggregate_line_sql_groups_by_color_column():
+    df = _daily_steps(VIZ_LINE_MAX_POINTS + 1)
+    df["kind"] = "walk"
+    spec = {"chart_type": "line", "x_axis": "date", "y_axis": ["steps"], "color_by": "kind"}
+    
+    sql = aggregate_line_sql(VIZ_SQL, spec, df)
+    
+    assert "GROUP BY 1, 2" in sql
+    assert "\"kind\", AVG(" in sql
+
+
+def test_aggregate_line_sql_leaves_short_or_non_line_charts():
+    spec = {"chart_type": "line", "x_axis": "date", "y_axis": "steps"}
+    assert aggregate_line_sql(VIZ_SQL, spec, _daily_steps(VIZ_LINE_MAX_POINTS)) is None
+    
+    bar_spec = {**spec, "chart_type": "bar"}
+    assert aggregate_line_sql(VIZ_SQL, bar_spec, _daily_steps(VIZ_LINE_MAX_POINTS + 1)) is None
+
+
+def test_aggregate_line_sql_skips_numeric_x_axis():
+    df = pd.DataFrame({"km": range(VIZ_LINE_MAX_POINTS + 1), "hr": range(VIZ_LINE_MAX_POINTS + 1)})
+    spec = {"chart_type": "line", "x_axis": "km", "y_axis": "hr"}
+    assert aggregate_line_sql(VIZ_SQL, spec, df) is None
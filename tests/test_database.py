@@ -0,0 +1,26 @@
+"""
+Tests for the SQL helpers in src/database.py (no database needed).
+"""
+from src.database import as_subquery
+
+
+def _wrapped(sql: str) -> str:
+    return f"SELECT * FROM ({as_subquery(sql)}) AS limited_query LIMIT 10"
+
+
+def test_as_subquery_keeps_plain_query():
+    assert _wrapped("SELECT 1") == "SELECT * FROM (\nSELECT 1\n) AS limited_query LIMIT 10"
+
+
+def test_as_subquery_trailing_comment_does_not_swallow_paren():
+    wrapped = _wrapped("SELECT date, steps\nFROM daily_summary -- last 30 days")
+    assert wrapped.endswith("-- last 30 days\n) AS limited_query LIMIT 10")
+
+
+def test_as_subquery_strips_semicolon_and_comments():
+    sql = "SELECT date\nFROM sleep\nORDER BY date; -- newest last\n-- done\n\n"
+    assert as_subquery(sql) == "\nSELECT date\nFROM sleep\nORDER BY date\n"
+
+
+def test_as_subquery_strips_semicolon_on_its_own_line():
+    assert as_subquery("SELECT 1\n;\n") == "\nSELECT 1\n"
@@ -4,16 +4,19 @@ A ChatGPT-style interface for exploring Garmin data with AI-powered insights and
 """
 import streamlit as st
 import sys
+import hashlib
 from pathlib import Path
-from datetime import date, timedelta
-import pandas as pd
+from typing import TYPE_CHECKING
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
-from src.ai_explorer import ask_with_chart, ConversationTurn
-from src.visualization import render_chart
-from src.database import get_table_stats, check_connection
+# The LLM client and Plotly are imported on first use (first question / first
+# chart), so the sidebar comes up without paying for them
+from src.database import get_table_stats, get_data_version
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Garmin brand colors
 GARMIN_BLUE = "#007CC3"
@@ -21,6 +24,13 @@ GARMIN_TEAL = "#00A9CE"
 GARMIN_ORANGE = "#FF6A13"
 GARMIN_DARK = "#1A2332"
 
+# Chat history kept in session_state: rows of data kept per answer and total messages
+HISTORY_PREVIEW_ROWS = 50
+MAX_HISTORY_MESSAGES = 40
+# Messages drawn per rerun (more on request) and turns sent to the LLM as context
+VISIBLE_MESSAGES = 20
+MAX_CONTEXT_TURNS = 20
+
 # Page config
 st.set_page_config(
     page_title="Garmin AI Explorer",
@@ -134,17 +144,140 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 
+@st.cache_data(ttl=300, show_spinner=False)
+def load_table_stats(data_version: int):
+    """
+    Table stats, cached per data version (recomputed only after new rows are written).
+    
+    Returns:
+        Dict with "tables" (stats per table), "total_count" (rows over all tables)
+        and "date_range" ((first_date, last_date) over all tables, or None)
+    """
+    stats = get_table_stats()
+    dates = [
+        day for data in stats.values()
+        for day in (data.get('min_date'), data.get('max_date')) if day
+    ]
+    return {
+        "tables": stats,
+        "total_count": sum(data.get('count', 0) for data in stats.values()),
+        "date_range": (min(dates), max(dates)) if dates else None,
+    }
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_data_version():
+    """
+    Data version token, re-read at most every 30 seconds rather than on every rerun.
+    
+    Returns None (also cached) when the database can't be reached.
+    """
+    try:
+        # Cheap catalog read that doubles as the connection check
+        return get_data_version()
+    except Exception as e:
+        print(f"Database connection failed: {e}")
+        return None
+
+
+@st.cache_resource
+def answer_memo():
+    """
+    Finished answers keyed on (question, conversation fingerprint, data version).
+    
+    Re-asking a question in the same context (e.g. re-clicking an example after
+    "New Conversation") replays the previous answer without LLM or SQL work.
+    """
+    from src.cache import TTLCache
+    
+    return TTLCache(maxsize=128, ttl=3600)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def build_chart(viz_df: "pd.DataFrame", chart_spec: dict):
+    """render_chart memoized on the chart data and spec (Streamlit hashes both)."""
+    from src.visualization import render_chart
+    
+    return render_chart(viz_df, chart_spec)
+
+
+def answer_key(question: str) -> tuple:
+    """Memo key for a question in the current conversation."""
+    return question, st.session_state.get("history_fp", ""), load_data_version()
+
+
+def extend_history_fingerprint(fingerprint: str, question: str, sql: str) -> str:
+    """
+    Fold one more turn into the conversation fingerprint.
+    
+    The fingerprint identifies the whole conversation so far (it is updated once
+    per turn), so cache keys don't have to hash every turn on each lookup.
+    """
+    data = "\0".join((fingerprint, question, sql)).encode()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
 def get_data_stats():
-    """Get statistics from the PostgreSQL database."""
+    """
+    Get statistics from the PostgreSQL database.
+    
+    Returns:
+        Stats dict from load_table_stats, None if the database can't be
+        reached, or an empty dict if the stats query failed
+    """
+    data_version = load_data_version()
+    if data_version is None:
+        return None
     try:
-        if not check_connection():
-            return None
-        return get_table_stats()
+        return load_table_stats(data_version)
     except Exception as e:
         st.error(f"Error loading database stats: {e}")
         return {}
 
 
+@st.fragment(run_every=60)
+def render_data_stats():
+    """
+    Database stats for the sidebar.
+    
+    A fragment, so it also refreshes on its own every minute (picking up a sync
+    while the page sits idle) without rerunning the chat.
+    """
+    with st.spinner("Loading stats..."):
+        stats = get_data_stats()
+    
+    if stats is None:
+        st.error("Cannot connect to PostgreSQL")
+        st.code("docker-compose up -d", language="bash")
+        st.caption("Then run the backfill:")
+        st.code("python -m src.backfill", language="bash")
+    elif not stats or stats["total_count"] == 0:
+        st.warning("No data found. Run the backfill script first!")
+        st.code("python -m src.backfill", language="bash")
+    else:
+        # One markdown element for all cards rather than one per table
+        st.markdown("".join(f"""
+            <div class='stat-card'>
+                <p class='stat-value'>{data['count']:,}</p>
+                <p class='stat-label'>{entity.replace('_', ' ').title()}</p>
+            </div>
+            """ for entity, data in stats["tables"].items() if data.get('count', 0) > 0
+        ), unsafe_allow_html=True)
+        
+        # Show date range
+        if stats["date_range"]:
+            min_date, max_date = stats["date_range"]
+            st.caption(f"📅 Data range: {min_date} to {max_date}")
+
+
+def new_conversation():
+    """Clear the chat and the conversation context."""
+    st.session_state.messages = []
+    st.session_state.conversation_history = []
+    st.session_state.history_fp = ""
+    st.session_state.visible_messages = VISIBLE_MESSAGES
+
+
 def render_sidebar():
     """Render the sidebar with database stats and info."""
     with st.sidebar:
@@ -160,39 +293,7 @@ def render_sidebar():
         # Database Stats
         st.subheader("📊 Database")
         
-        with st.spinner("Loading stats..."):
-            stats = get_data_stats()
-        
-        if stats is None:
-            st.error("Cannot connect to PostgreSQL")
-            st.code("docker-compose up -d", language="bash")
-            st.caption("Then run the backfill:")
-            st.code("python -m src.backfill", language="bash")
-        elif not stats or all(s.get('count', 0) == 0 for s in stats.values()):
-            st.warning("No data found. Run the backfill script first!")
-            st.code("python -m src.backfill", language="bash")
-        else:
-            for entity, data in stats.items():
-                if data.get('count', 0) > 0:
-                    st.markdown(f"""
-                    <div class='stat-card'>
-                        <p class='stat-value'>{data['count']:,}</p>
-                        <p class='stat-label'>{entity.replace('_', ' ').title()}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-            
-            # Show date range
-            all_dates = []
-            for data in stats.values():
-                if data.get('min_date'):
-                    all_dates.append(pd.to_datetime(data['min_date']))
-                if data.get('max_date'):
-                    all_dates.append(pd.to_datetime(data['max_date']))
-            
-            if all_dates:
-                min_date = min(all_dates).date()
-                max_date = max(all_dates).date()
-                st.caption(f"📅 Data range: {min_date} to {max_date}")
+        render_data_stats()
         
         st.markdown("---")
         
@@ -223,11 +324,113 @@ def render_sidebar():
             </div>
             """, unsafe_allow_html=True)
         
-        # New Conversation button
-        if st.button("✨ New Conversation", use_container_width=True):
-            st.session_state.messages = []
-            st.session_state.conversation_history = []
-            st.rerun()
+        # New Conversation button (the callback clears the state before the
+        # rerun the click triggers, so no second st.rerun() is needed)
+        st.button("✨ New Conversation", use_container_width=True, on_click=new_conversation)
+
+
+def append_message(message: dict):
+    """
+    Add a message to the chat history, dropping the oldest beyond MAX_HISTORY_MESSAGES.
+    
+    Assistant answers keep only the first HISTORY_PREVIEW_ROWS rows of their data
+    (with the full row count) so session memory doesn't grow with result sizes.
+    """
+    preview = message.get("data_preview")
+    if preview is not None:
+        message["row_count"] = len(preview)
+        message["data_preview"] = preview.head(HISTORY_PREVIEW_ROWS)
+    
+    messages = st.session_state.messages
+    messages.append(message)
+    del messages[:-MAX_HISTORY_MESSAGES]
+
+
+def answer_question(question: str):
+    """Show a question and its answer in the chat, and add both to the history."""
+    # Add user message
+    append_message({"role": "user", "content": question})
+    
+    # Display user message
+    with st.chat_message("user"):
+        st.markdown(question)
+    
+    # Generate response
+    with st.chat_message("assistant"):
+        try:
+            memo = answer_memo()
+            key = answer_key(question)
+            answer = memo.get(key)
+            if answer is None:
+                from src.ai_explorer import ask_with_chart_stream
+                
+                with st.spinner("Thinking..."):
+                    # SQL and answer data first; the summary streams below
+                    # while the chart is prepared in the background
+                    sql, df, summary_chunks, finish = ask_with_chart_stream(
+                        question,
+                        conversation_history=st.session_state.conversation_history,
+                        data_version=key[2]  # answer_key() already read it
+                    )
+            else:
+                sql, df, summary, chart_spec, viz_df, conv_turn = answer
+            
+            # Show SQL
+            with st.expander("🔍 SQL Query", expanded=False):
+                st.code(sql, language="sql")
+            
+            # Keep the chart above the summary even though it is ready later
+            chart_slot = st.empty()
+            
+            # Show summary
+            if answer is None:
+                summary = st.write_stream(summary_chunks)
+                with st.spinner("Preparing chart..."):
+                    chart_spec, viz_df, conv_turn = finish(summary)
+                memo.set(key, (sql, df, summary, chart_spec, viz_df, conv_turn))
+            else:
+                st.markdown(summary)
+            
+            # Update conversation history for next question
+            st.session_state.conversation_history.append(conv_turn)
+            del st.session_state.conversation_history[:-MAX_CONTEXT_TURNS]
+            st.session_state.history_fp = extend_history_fingerprint(
+                st.session_state.get("history_fp", ""), conv_turn.question, conv_turn.sql
+            )
+            
+            # Render chart using visualization data
+            chart = None
+            if chart_spec and not viz_df.empty:
+                try:
+                    chart = build_chart(viz_df, chart_spec)
+                    # Use unique key based on message count
+                    chart_slot.plotly_chart(chart, use_container_width=True, key=f"chart_new_{len(st.session_state.messages)}")
+                except Exception as e:
+                    chart_slot.warning(f"Could not render chart: {e}")
+                    chart = None
+            
+            # Show data preview
+            if not df.empty:
+                with st.expander(f"📋 Data ({len(df)} rows)", expanded=False):
+                    st.dataframe(df, use_container_width=True)
+            
+            # Save to message history
+            append_message({
+                "role": "assistant",
+                "sql": sql,
+                "chart": chart,
+                "summary": summary,
+                "data_preview": df if not df.empty else None
+            })
+            
+        except Exception as e:
+            error_msg = f"❌ **Error:** {str(e)}"
+            st.error(error_msg)
+            append_message({
+                "role": "assistant",
+                "summary": error_msg,
+                "chart": None
+            })
 
 
 def main():
@@ -252,8 +455,15 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    # Display chat messages
-    for idx, message in enumerate(st.session_state.messages):
+    # Display chat messages (only the most recent ones; older ones on request)
+    messages = st.session_state.messages
+    visible = st.session_state.get("visible_messages", VISIBLE_MESSAGES)
+    hidden = max(len(messages) - visible, 0)
+    if hidden and st.button(f"Show {min(hidden, VISIBLE_MESSAGES)} earlier messages"):
+        st.session_state.visible_messages = visible + VISIBLE_MESSAGES
+        st.rerun()
+    
+    for idx, message in enumerate(messages[hidden:], hidden):
         with st.chat_message(message["role"]):
             if message["role"] == "user":
                 st.markdown(message["content"])
@@ -270,138 +480,22 @@ def main():
                     st.markdown(message["summary"])
                 
                 if "data_preview" in message and message["data_preview"] is not None:
-                    with st.expander(f"📋 Data ({len(message['data_preview'])} rows)", expanded=False):
-                        st.dataframe(message["data_preview"], use_container_width=True)
+                    preview = message["data_preview"]
+                    row_count = message.get("row_count", len(preview))
+                    with st.expander(f"📋 Data ({row_count} rows)", expanded=False):
+                        st.dataframe(preview, use_container_width=True)
+                        if row_count > len(preview):
+                            st.caption(f"Showing the first {len(preview)} rows")
     
     # Handle example question from sidebar
     if hasattr(st.session_state, 'example_question'):
         question = st.session_state.example_question
         del st.session_state.example_question
-        
-        # Add user message
-        st.session_state.messages.append({"role": "user", "content": question})
-        
-        # Process question
-        with st.chat_message("user"):
-            st.markdown(question)
-        
-        with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    # Get response with chart (with conversation context)
-                    sql, df, summary, chart_spec, viz_df, conv_turn = ask_with_chart(
-                        question, 
-                        conversation_history=st.session_state.conversation_history
-                    )
-                    
-                    # Update conversation history for next question
-                    st.session_state.conversation_history.append(conv_turn)
-                    
-                    # Show SQL
-                    with st.expander("🔍 SQL Query", expanded=False):
-                        st.code(sql, language="sql")
-                    
-                    # Render chart using visualization data
-                    chart = None
-                    if chart_spec and not viz_df.empty:
-                        try:
-                            chart = render_chart(viz_df, chart_spec)
-                            # Use unique key based on message count
-                            st.plotly_chart(chart, use_container_width=True, key=f"chart_new_{len(st.session_state.messages)}")
-                        except Exception as e:
-                            st.warning(f"Could not render chart: {e}")
-                            chart = None
-                    
-                    # Show summary
-                    st.markdown(summary)
-                    
-                    # Show data preview
-                    if not df.empty:
-                        with st.expander(f"📋 Data ({len(df)} rows)", expanded=False):
-                            st.dataframe(df, use_container_width=True)
-                    
-                    # Save to message history
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "sql": sql,
-                        "chart": chart,
-                        "summary": summary,
-                        "data_preview": df if not df.empty else None
-                    })
-                    
-                except Exception as e:
-                    error_msg = f"❌ **Error:** {str(e)}"
-                    st.error(error_msg)
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "summary": error_msg,
-                        "chart": None
-                    })
-        
-        st.rerun()
+        answer_question(question)
     
     # Chat input
     if prompt := st.chat_input("Ask a question about your Garmin data..."):
-        # Add user message
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        
-        # Display user message
-        with st.chat_message("user"):
-            st.markdown(prompt)
-        
-        # Generate response
-        with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    # Get response with chart (with conversation context)
-                    sql, df, summary, chart_spec, viz_df, conv_turn = ask_with_chart(
-                        prompt,
-                        conversation_history=st.session_state.conversation_history
-                    )
-                    
-                    # Update conversation history for next question
-                    st.session_state.conversation_history.append(conv_turn)
-                    
-                    # Show SQL
-                    with st.expander("🔍 SQL Query", expanded=False):
-                        st.code(sql, language="sql")
-                    
-                    # Render chart using visualization data
-                    chart = None
-                    if chart_spec and not viz_df.empty:
-                        try:
-                            chart = render_chart(viz_df, chart_spec)
-                            # Use unique key based on message count
-                            st.plotly_chart(chart, use_container_width=True, key=f"chart_new_{len(st.session_state.messages)}")
-                        except Exception as e:
-                            st.warning(f"Could not render chart: {e}")
-                            chart = None
-                    
-                    # Show summary
-                    st.markdown(summary)
-                    
-                    # Show data preview
-                    if not df.empty:
-                        with st.expander(f"📋 Data ({len(df)} rows)", expanded=False):
-                            st.dataframe(df, use_container_width=True)
-                    
-                    # Save to message history
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "sql": sql,
-                        "chart": chart,
-                        "summary": summary,
-                        "data_preview": df if not df.empty else None
-                    })
-                    
-                except Exception as e:
-                    error_msg = f"❌ **Error:** {str(e)}"
-                    st.error(error_msg)
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "summary": error_msg,
-                        "chart": None
-                    })
+        answer_question(prompt)
 
 
 if __name__ == "__main__":